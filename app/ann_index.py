@@ -0,0 +1,226 @@
+import os
+import numpy as np
+
+INDEX_SUFFIX = '.ivf.npz'
+NPROBE = 4
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 50000
+# Re-cluster when the gallery has grown or shrunk this much since the centroids were trained.
+RECLUSTER_RATIO = 4.0
+
+
+def index_path(model_path):
+    """trainer.yml -> trainer.ivf.npz, next to the model."""
+    return os.path.splitext(model_path)[0] + INDEX_SUFFIX
+
+
+def default_nlist(samples):
+    return int(max(1, min(samples, round(4 * np.sqrt(samples)))))
+
+
+_poolings = {}
+
+
+def _uniform_pooling(neighbors):
+    """0/1 matrix mapping each LBP code to its uniform-pattern bin.
+
+    Uniform codes (at most two 0/1 transitions around the circle) keep a
+    bin of their own and every other code shares the last bin, giving 59
+    bins instead of 256 for 8 neighbours.
+    """
+    if neighbors not in _poolings:
+        bins = 2 ** neighbors
+        uniform = []
+        for code in range(bins):
+            bits = [(code >> n) & 1 for n in range(neighbors)]
+            if sum(bits[n] != bits[(n + 1) % neighbors] for n in range(neighbors)) <= 2:
+                uniform.append(code)
+        pooling = np.zeros((bins, len(uniform) + 1), dtype=np.float32)
+        pooling[:, -1] = 1.0
+        pooling[uniform, -1] = 0.0
+        pooling[uniform, np.arange(len(uniform))] = 1.0
+        _poolings[neighbors] = pooling
+    return _poolings[neighbors]
+
+
+def coarse_descriptors(histograms, neighbors=8):
+    """Shrink LBPH spatial histograms to per-cell uniform-pattern histograms and take the square root.
+
+    An 8x8 grid gives a 3776-value descriptor instead of 16384. Euclidean
+    distance between square-rooted histograms is the Hellinger distance,
+    which ranks faces much like the chi-square distance used for the final
+    answer.
+    """
+    histograms = np.atleast_2d(histograms)
+    pooling = _uniform_pooling(neighbors)
+    bins, classes = pooling.shape
+    cells_per_sample = histograms.shape[1] // bins
+    descriptors = np.empty((len(histograms), cells_per_sample * classes), dtype=np.float32)
+    for start in range(0, len(histograms), 4096):
+        chunk = np.asarray(histograms[start:start + 4096], dtype=np.float32)
+        pooled = chunk.reshape(len(chunk), cells_per_sample, bins) @ pooling
+        descriptors[start:start + len(chunk)] = np.sqrt(pooled.reshape(len(chunk), -1))
+    return descriptors
+
+
+def _nearest(points, centroids, centroid_norms, count=1):
+    scores = centroid_norms[None, :] - 2.0 * (points @ centroids.T)
+    if count == 1:
+        return scores.argmin(axis=1)
+    count = min(count, len(centroids))
+    nearest = np.argpartition(scores, count - 1, axis=1)[:, :count]
+    return nearest
+
+
+def kmeans(points, k, iterations=KMEANS_ITERATIONS, seed=0):
+    rng = np.random.default_rng(seed)
+    if len(points) > KMEANS_SAMPLE:
+        points = points[rng.choice(len(points), KMEANS_SAMPLE, replace=False)]
+    centroids = points[rng.choice(len(points), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _nearest(points, centroids, (centroids ** 2).sum(axis=1))
+        counts = np.bincount(assignments, minlength=k)
+        order = np.argsort(assignments, kind='stable')
+        starts = np.searchsorted(assignments[order], np.arange(k))
+        empty = counts == 0
+        sums = np.add.reduceat(points[order], starts[~empty], axis=0)
+        centroids[~empty] = sums / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = points[rng.choice(len(points), int(empty.sum()), replace=False)]
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index that narrows a face search to a few clusters.
+
+    Training samples are clustered on their coarse descriptors. A query
+    visits the `nprobe` clusters closest to it and returns their sample
+    positions, which NumpyLBPHRecognizer then scores exactly. Positions
+    follow the recognizer's training order: add() appends samples as
+    recognizer.update() does, and remove() drops a user's samples.
+    """
+
+    def __init__(self, nlist=None, nprobe=NPROBE, neighbors=8):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.neighbors = neighbors
+        self.centroids = None
+        self.trained_size = 0
+        self.assignments = np.empty(0, dtype=np.int32)
+        self.labels = np.empty(0, dtype=np.int32)
+        self._order = self.assignments
+        self._offsets = np.zeros(1, dtype=np.int64)
+
+    @property
+    def size(self):
+        return len(self.labels)
+
+    def build(self, histograms, labels, seed=0):
+        """Cluster the samples from scratch and assign each one to a list."""
+        points = coarse_descriptors(histograms, self.neighbors)
+        nlist = min(self.nlist or default_nlist(len(points)), len(points))
+        self._set_centroids(kmeans(points, nlist, seed=seed) if len(points) else None)
+        self.trained_size = len(points)
+        self._assign(points, labels, append=False)
+
+    def reassign(self, histograms, labels):
+        """Refill the lists for a new set of samples, keeping the current clusters when they still fit."""
+        count = len(labels)
+        if (self.centroids is None or not count or
+                max(count, self.trained_size) > RECLUSTER_RATIO * max(min(count, self.trained_size), 1)):
+            self.build(histograms, labels)
+            return
+        self._assign(coarse_descriptors(histograms, self.neighbors), labels, append=False)
+
+    def add(self, histograms, labels):
+        if self.centroids is None:
+            self.build(histograms, labels)
+            return
+        self._assign(coarse_descriptors(histograms, self.neighbors), labels, append=True)
+
+    def remove(self, label):
+        """Drop every sample of one user. Later positions shift down, matching the retrained recognizer."""
+        keep = self.labels != label
+        self.assignments = self.assignments[keep]
+        self.labels = self.labels[keep]
+        self._rebuild_lists()
+        return int((~keep).sum())
+
+    def candidates(self, histogram, nprobe=None):
+        """Sample positions in the clusters closest to one probe histogram."""
+        if self.centroids is None or not self.size:
+            return np.empty(0, dtype=np.int64)
+        point = coarse_descriptors(histogram, self.neighbors)
+        lists = _nearest(point, self.centroids, self._centroid_norms, nprobe or self.nprobe)
+        lists = np.atleast_1d(lists.ravel())
+        return np.concatenate([self._order[self._offsets[l]:self._offsets[l + 1]] for l in lists])
+
+    def save(self, path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as file:
+            np.savez(file, centroids=self.centroids if self.centroids is not None else np.empty((0, 0), np.float32),
+                     assignments=self.assignments, labels=self.labels,
+                     meta=np.array([self.nprobe, self.neighbors, self.trained_size, self.nlist or 0]))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            nprobe, neighbors, trained_size, nlist = (int(v) for v in data['meta'])
+            index = cls(nlist=nlist or None, nprobe=nprobe, neighbors=neighbors)
+            index._set_centroids(data['centroids'] if data['centroids'].size else None)
+            index.trained_size = trained_size
+            index.assignments = data['assignments']
+            index.labels = data['labels']
+        index._rebuild_lists()
+        return index
+
+    def _set_centroids(self, centroids):
+        self.centroids = None if centroids is None else np.ascontiguousarray(centroids, dtype=np.float32)
+        if self.centroids is not None:
+            self._centroid_norms = (self.centroids ** 2).sum(axis=1)
+
+    def _assign(self, points, labels, append):
+        labels = np.asarray(labels, dtype=np.int32).ravel()
+        assignments = np.empty(0, dtype=np.int32)
+        for start in range(0, len(points), 4096):
+            chunk = _nearest(points[start:start + 4096], self.centroids, self._centroid_norms)
+            assignments = np.concatenate([assignments, chunk.astype(np.int32)])
+        if append:
+            assignments = np.concatenate([self.assignments, assignments])
+            labels = np.concatenate([self.labels, labels])
+        self.assignments = assignments
+        self.labels = labels
+        self._rebuild_lists()
+
+    def _rebuild_lists(self):
+        nlist = 0 if self.centroids is None else len(self.centroids)
+        self._order = np.argsort(self.assignments, kind='stable')
+        self._offsets = np.searchsorted(self.assignments[self._order], np.arange(nlist + 1))
+
+
+def build_index(model_path, nlist=None, nprobe=NPROBE):
+    """Build the IVF index for an existing trainer.yml and save it next to the model."""
+    from app.lbph import NumpyLBPHRecognizer
+
+    engine = NumpyLBPHRecognizer()
+    engine.read(model_path)
+    index = IVFIndex(nlist=nlist, nprobe=nprobe, neighbors=engine.neighbors)
+    index.build(engine.histograms, engine.labels)
+    index.save(index_path(model_path))
+    print(f"IVF index built: {index.size} samples in {len(index.centroids) if index.size else 0} lists.")
+    return index
+
+
+if __name__ == '__main__':
+    import argparse
+    from app.model_registry import MODEL_PATH
+
+    parser = argparse.ArgumentParser(description="Approximate nearest-neighbour index for the face model")
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--nlist', type=int, default=None, help="Number of clusters (default: 4 * sqrt(samples))")
+    parser.add_argument('--nprobe', type=int, default=NPROBE, help="Clusters searched per query")
+    args = parser.parse_args()
+
+    build_index(args.model, args.nlist, args.nprobe)
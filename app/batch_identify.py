@@ -0,0 +1,220 @@
+import cv2
+import csv
+import json
+import multiprocessing
+import os
+import time
+from app.detection import MIN_FACE_SIZE, FaceDetector
+from app.frame_source import IMAGE_EXTENSIONS
+from app.model_registry import MODEL_PATH, get_model_registry
+from app.sample_store import normalize_face
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.m4v', '.mpg', '.mpeg', '.wmv')
+RESULT_FIELDS = ['source', 'frame', 'x', 'y', 'w', 'h', 'face_id', 'username', 'confidence']
+
+# None uses every core; 1 runs detection and prediction in the calling process.
+BATCH_WORKERS = None
+IMAGE_CHUNK_SIZE = 32
+VIDEO_SEGMENT_FRAMES = 300
+
+
+def iter_work_units(inputs, chunk_size=IMAGE_CHUNK_SIZE, segment_frames=VIDEO_SEGMENT_FRAMES):
+    """Expand files and folders into work units without reading any pixels.
+
+    Images are grouped into ('images', [paths]) chunks. Videos are cut into
+    ('video', path, start, end) frame ranges so several workers can decode
+    one long recording at once; end is None when the frame count is unknown.
+    """
+    images = []
+    for path in _iter_files(inputs):
+        lower = path.lower()
+        if lower.endswith(IMAGE_EXTENSIONS):
+            images.append(path)
+            if len(images) >= chunk_size:
+                yield ('images', images)
+                images = []
+        elif lower.endswith(VIDEO_EXTENSIONS):
+            cap = cv2.VideoCapture(path)
+            if not cap.isOpened():
+                print(f"Cannot open video file: {path}")
+                continue
+            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            cap.release()
+            if frame_count <= 0:
+                yield ('video', path, 0, None)
+                continue
+            for start in range(0, frame_count, segment_frames):
+                yield ('video', path, start, min(start + segment_frames, frame_count))
+    if images:
+        yield ('images', images)
+
+
+def _iter_files(inputs):
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    yield os.path.join(root, name)
+        elif os.path.exists(path):
+            yield path
+        else:
+            print(f"Input not found: {path}")
+
+
+_worker_state = None
+
+
+def _init_worker(model_path, min_face, frame_step, threads=1):
+    global _worker_state
+    cv2.setNumThreads(threads)
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(model_path)
+    detector = FaceDetector(get_model_registry().get_cascade(), min_face=min_face)
+    _worker_state = (detector, recognizer, frame_step)
+
+
+def _identify_frame(frame, source, frame_index):
+    detector, recognizer, _ = _worker_state
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    rows = []
+    for (x, y, w, h) in detector.detect(gray):
+        face_id, confidence = recognizer.predict(normalize_face(gray[y:y + h, x:x + w]))
+        rows.append({'source': source, 'frame': frame_index, 'x': int(x), 'y': int(y), 'w': int(w), 'h': int(h),
+                     'face_id': int(face_id), 'confidence': round(float(confidence), 3)})
+    return rows
+
+
+def _process_unit(unit):
+    """Return (frames_processed, rows) for one work unit."""
+    frames = 0
+    rows = []
+    if unit[0] == 'images':
+        for path in unit[1]:
+            frame = cv2.imread(path)
+            if frame is None:
+                continue
+            frames += 1
+            rows.extend(_identify_frame(frame, path, 0))
+        return frames, rows
+
+    _, path, start, end = unit
+    frame_step = _worker_state[2]
+    cap = cv2.VideoCapture(path)
+    first = start + (-start) % frame_step
+    if first:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+    index = first
+    while end is None or index < end:
+        if (index - first) % frame_step:
+            if not cap.grab():
+                break
+        else:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames += 1
+            rows.extend(_identify_frame(frame, path, index))
+        index += 1
+    cap.release()
+    return frames, rows
+
+
+def identify_batch(inputs, model_path=MODEL_PATH, workers=BATCH_WORKERS, chunk_size=IMAGE_CHUNK_SIZE,
+                   segment_frames=VIDEO_SEGMENT_FRAMES, frame_step=1, min_face=MIN_FACE_SIZE, usernames=None, stats=None):
+    """Identify every face in the given images, videos and folders.
+
+    Yields one dict per face with the RESULT_FIELDS keys, in input order.
+    usernames maps face_id to a username; unknown ids get an empty name.
+    If stats is a dict it is filled with frames, faces and elapsed_s as the
+    results stream.
+    """
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model file not found: {model_path}")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    usernames = usernames or {}
+    if stats is None:
+        stats = {}
+    stats.update(frames=0, faces=0, elapsed_s=0.0)
+    units = iter_work_units(inputs, chunk_size, segment_frames)
+    started = time.perf_counter()
+
+    def _emit(results):
+        for frames, rows in results:
+            stats['frames'] += frames
+            stats['faces'] += len(rows)
+            for row in rows:
+                row['username'] = usernames.get(row['face_id'], '')
+                yield row
+            stats['elapsed_s'] = time.perf_counter() - started
+
+    if workers <= 1:
+        _init_worker(model_path, min_face, frame_step, threads=cv2.getNumThreads())
+        yield from _emit(_process_unit(unit) for unit in units)
+        return
+
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(model_path, min_face, frame_step)) as pool:
+        yield from _emit(pool.imap(_process_unit, units))
+
+
+def load_usernames(storage='json'):
+    """Map face_id to username from the user store; empty when storage is 'none'."""
+    if storage == 'none':
+        return {}
+    if storage == 'sqlite':
+        from app.sqlite_repository import SQLiteUserRepository
+        repository = SQLiteUserRepository()
+        rows = repository.connection.execute("SELECT record FROM users WHERE face_id IS NOT NULL").fetchall()
+        users = [repository._materialize(row) for row in rows]
+        repository.close()
+        return {user.face_id: user.username for user in users}
+
+    from app.repository import UserRepository
+    repository = UserRepository()
+    return {user.face_id: user.username for user in repository.users if user.face_id is not None}
+
+
+def write_results(rows, output, fmt=None):
+    """Stream rows to a CSV or JSONL file (by extension unless fmt is given). Returns the row count."""
+    if fmt is None:
+        fmt = 'jsonl' if output.lower().endswith(('.jsonl', '.json')) else 'csv'
+    count = 0
+    with open(output, 'w', newline='', encoding='utf-8') as file:
+        writer = None
+        if fmt == 'csv':
+            writer = csv.DictWriter(file, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+        for row in rows:
+            if writer:
+                writer.writerow(row)
+            else:
+                file.write(json.dumps({field: row[field] for field in RESULT_FIELDS}, ensure_ascii=False) + '\n')
+            count += 1
+    return count
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Identify faces across image folders and video files")
+    parser.add_argument('inputs', nargs='+', help="Image files, video files or folders (searched recursively)")
+    parser.add_argument('--output', '-o', required=True, help="Result file, .csv or .jsonl")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default=None)
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--workers', type=int, default=BATCH_WORKERS)
+    parser.add_argument('--chunk-size', type=int, default=IMAGE_CHUNK_SIZE, help="Images per work unit")
+    parser.add_argument('--segment-frames', type=int, default=VIDEO_SEGMENT_FRAMES, help="Video frames per work unit")
+    parser.add_argument('--frame-step', type=int, default=1, help="Process every Nth video frame")
+    parser.add_argument('--min-face', type=int, default=MIN_FACE_SIZE)
+    parser.add_argument('--storage', choices=['json', 'sqlite', 'none'], default='json',
+                        help="User store used to resolve usernames")
+    args = parser.parse_args()
+
+    stats = {}
+    rows = identify_batch(args.inputs, args.model, args.workers, args.chunk_size, args.segment_frames,
+                          max(args.frame_step, 1), args.min_face, load_usernames(args.storage), stats)
+    count = write_results(rows, args.output, args.format)
+    elapsed = stats['elapsed_s'] or 1e-9
+    print(f"{stats['frames']} frames, {count} faces in {elapsed:.2f} s "
+          f"({count / elapsed:.1f} faces/sec, {stats['frames'] / elapsed:.1f} frames/sec). Results: {args.output}")
@@ -0,0 +1,121 @@
+from collections import deque, namedtuple
+from app.detection import box_iou
+
+PENDING = 'pending'
+ACCEPT = 'accept'
+REJECT = 'reject'
+
+Decision = namedtuple('Decision', ['state', 'label', 'score', 'track_id'])
+
+
+class FaceTrack:
+    def __init__(self, track_id, box, window):
+        self.track_id = track_id
+        self.box = box
+        self.predictions = deque(maxlen=window)
+        self.trace = []
+        self.missed_frames = 0
+
+
+class VotingDecider:
+    """Multi-frame accept/reject decisions for face login.
+
+    Faces are followed across frames by box overlap. Each track keeps a
+    sliding window of its last `window` predictions. A prediction below
+    `accept_confidence` votes for its label with a weight that rises
+    linearly to 1.0 at `strong_confidence`. The track is accepted once a
+    label's votes reach `accept_score` and outweigh every other label by
+    `dominance` times, so one very confident frame decides at once while
+    borderline frames need to agree. The track is rejected once
+    `reject_votes` predictions in the window are at or above
+    `reject_confidence`.
+    """
+
+    def __init__(self, window=10, accept_confidence=50, strong_confidence=30, accept_score=1.0, dominance=2.0,
+                 reject_confidence=70, reject_votes=6, max_missed_frames=5, match_iou=0.3):
+        self.window = window
+        self.accept_confidence = accept_confidence
+        self.strong_confidence = strong_confidence
+        self.accept_score = accept_score
+        self.dominance = dominance
+        self.reject_confidence = reject_confidence
+        self.reject_votes = reject_votes
+        self.max_missed_frames = max_missed_frames
+        self.match_iou = match_iou
+        self.tracks = []
+        self.finished_tracks = []
+        self.next_track_id = 1
+        self.frame_index = 0
+        self._seen = set()
+
+    def vote_weight(self, confidence):
+        if confidence >= self.accept_confidence:
+            return 0.0
+        span = max(self.accept_confidence - self.strong_confidence, 1e-6)
+        return min(1.0, (self.accept_confidence - confidence) / span)
+
+    def observe(self, box, label, confidence):
+        track = self._match(box)
+        track.box = box
+        track.missed_frames = 0
+        track.predictions.append((label, confidence))
+        track.trace.append({'frame': self.frame_index, 'label': int(label), 'confidence': float(confidence)})
+        self._seen.add(track.track_id)
+        return self._decide(track)
+
+    def end_frame(self):
+        for track in list(self.tracks):
+            if track.track_id not in self._seen:
+                track.missed_frames += 1
+                if track.missed_frames > self.max_missed_frames:
+                    self._finish(track)
+        self._seen = set()
+        self.frame_index += 1
+
+    def reset_track(self, track_id):
+        for track in self.tracks:
+            if track.track_id == track_id:
+                track.predictions.clear()
+
+    def trace(self):
+        return [{'track_id': track.track_id, 'predictions': list(track.trace)}
+                for track in self.finished_tracks + self.tracks]
+
+    def _match(self, box):
+        best, best_iou = None, self.match_iou
+        for track in self.tracks:
+            if track.track_id in self._seen:
+                continue
+            iou = box_iou(track.box, box)
+            if iou >= best_iou:
+                best, best_iou = track, iou
+        if best is None:
+            best = FaceTrack(self.next_track_id, box, self.window)
+            self.next_track_id += 1
+            self.tracks.append(best)
+        return best
+
+    def _finish(self, track):
+        self.tracks.remove(track)
+        self.finished_tracks.append(track)
+
+    def _decide(self, track):
+        scores = {}
+        rejects = 0
+        for label, confidence in track.predictions:
+            weight = self.vote_weight(confidence)
+            if weight:
+                scores[label] = scores.get(label, 0.0) + weight
+            if confidence >= self.reject_confidence:
+                rejects += 1
+
+        if scores:
+            label = max(scores, key=scores.get)
+            score = scores[label]
+            runner_up = max((v for k, v in scores.items() if k != label), default=0.0)
+            if score >= self.accept_score and score >= runner_up * self.dominance:
+                return Decision(ACCEPT, label, score, track.track_id)
+
+        if rejects >= self.reject_votes:
+            return Decision(REJECT, None, rejects, track.track_id)
+        return Decision(PENDING, None, max(scores.values(), default=0.0), track.track_id)
@@ -0,0 +1,123 @@
+import cv2
+
+CASCADE_PATH = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+
+# The cascade runs on a copy of the frame scaled by DETECTION_SCALE. Face size
+# bounds are in full-resolution pixels; MAX_FACE_SIZE = None means unbounded.
+DETECTION_SCALE = 0.5
+MIN_FACE_SIZE = 60
+MAX_FACE_SIZE = None
+
+
+def box_iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = min(ax + aw, bx + bw) - max(ax, bx)
+    ih = min(ay + ah, by + bh) - max(ay, by)
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    inter = iw * ih
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+class FaceDetector:
+    """Haar cascade detection on a downscaled frame, with boxes mapped back to full resolution."""
+
+    def __init__(self, face_cascade=None, scale=DETECTION_SCALE, min_face=MIN_FACE_SIZE, max_face=MAX_FACE_SIZE,
+                 scale_factor=1.3, min_neighbors=5):
+        self.face_cascade = face_cascade if face_cascade is not None else cv2.CascadeClassifier(CASCADE_PATH)
+        self.scale = scale
+        self.min_face = min_face
+        self.max_face = max_face
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+
+    def detect(self, gray, min_face=None, max_face=None):
+        min_face = max(self.min_face or 0, min_face or 0)
+        max_face = min((v for v in (self.max_face, max_face) if v), default=None)
+
+        scale = min(self.scale, 1.0)
+        small = gray
+        if scale < 1.0:
+            small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        min_side = max(1, int(min_face * scale))
+        if min(small.shape[:2]) < min_side:
+            return []
+        kwargs = {'minSize': (min_side, min_side)}
+        if max_face:
+            max_side = max(min_side, int(max_face * scale))
+            kwargs['maxSize'] = (max_side, max_side)
+
+        found = self.face_cascade.detectMultiScale(small, self.scale_factor, self.min_neighbors, **kwargs)
+
+        height, width = gray.shape[:2]
+        faces = []
+        for (x, y, w, h) in found:
+            x, y = int(x / scale), int(y / scale)
+            w, h = min(int(w / scale), width - x), min(int(h / scale), height - y)
+            faces.append((x, y, w, h))
+        return faces
+
+
+class FaceTracker:
+    """Track-then-detect wrapper around a FaceDetector.
+
+    After a detection, the following frames only search a padded window
+    around each previous box, limited to face sizes close to the previous
+    one. A full-frame detection runs every `redetect_every` frames and as
+    soon as every tracked face is lost.
+    """
+
+    def __init__(self, detector, redetect_every=10, padding=0.5, size_tolerance=0.3):
+        self.detector = detector
+        self.redetect_every = redetect_every
+        self.padding = padding
+        self.size_tolerance = size_tolerance
+        self.boxes = []
+        self.frames_since_full = 0
+        self.full_detections = 0
+        self.tracked_detections = 0
+
+    def reset(self):
+        self.boxes = []
+        self.frames_since_full = 0
+
+    def detect(self, gray):
+        faces = []
+        if self.boxes and self.frames_since_full < self.redetect_every:
+            faces = self._detect_tracked(gray)
+            self.tracked_detections += 1
+            self.frames_since_full += 1
+
+        if not faces:
+            faces = self.detector.detect(gray)
+            self.full_detections += 1
+            self.frames_since_full = 0
+
+        self.boxes = faces
+        return faces
+
+    def _detect_tracked(self, gray):
+        height, width = gray.shape[:2]
+        faces = []
+        for (x, y, w, h) in self.boxes:
+            pad_x = int(w * self.padding)
+            pad_y = int(h * self.padding)
+            x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+            x1, y1 = min(width, x + w + pad_x), min(height, y + h + pad_y)
+
+            found = self.detector.detect(gray[y0:y1, x0:x1],
+                                         min_face=int(min(w, h) * (1 - self.size_tolerance)),
+                                         max_face=int(max(w, h) * (1 + self.size_tolerance)))
+            for (fx, fy, fw, fh) in found:
+                box = (fx + x0, fy + y0, fw, fh)
+                if all(box_iou(box, other) < 0.5 for other in faces):
+                    faces.append(box)
+        return faces
+
+    def stats(self):
+        return {
+            'full_detections': self.full_detections,
+            'tracked_detections': self.tracked_detections,
+        }
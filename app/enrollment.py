@@ -0,0 +1,99 @@
+import cv2
+import numpy as np
+from app.sample_store import normalize_face
+
+MIN_SHARPNESS = 60.0
+MIN_FACE_SIZE = 80
+BRIGHTNESS_RANGE = (40, 220)
+MAX_SIMILARITY = 0.92
+TARGET_SAMPLES = 30
+MAX_SAMPLES = 70
+MAX_FRAMES = 900
+SIGNATURE_SIZE = (32, 32)
+
+
+def face_signature(face):
+    """Zero-mean, unit-length thumbnail of a normalized face.
+
+    The dot product of two signatures is their normalized correlation, so
+    near-identical crops score close to 1.0.
+    """
+    thumb = cv2.resize(face, SIGNATURE_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+    thumb -= thumb.mean()
+    norm = np.linalg.norm(thumb)
+    return thumb / norm if norm else thumb
+
+
+class EnrollmentSelector:
+    """Keeps only sharp, well-lit, large enough and mutually different face crops.
+
+    Each candidate is normalized to the sample size and checked for face
+    size, Laplacian variance (sharpness) and mean brightness, then compared
+    with every sample kept so far. A crop whose correlation with an
+    existing sample reaches `max_similarity` is dropped as a duplicate.
+    done() turns True once `target_samples` samples are kept (the stop
+    rule), `max_samples` is reached, or `max_frames` frames went by.
+    Set target_samples to None to fill up to the cap instead.
+    """
+
+    def __init__(self, min_sharpness=MIN_SHARPNESS, min_face_size=MIN_FACE_SIZE, brightness_range=BRIGHTNESS_RANGE,
+                 max_similarity=MAX_SIMILARITY, target_samples=TARGET_SAMPLES, max_samples=MAX_SAMPLES,
+                 max_frames=MAX_FRAMES):
+        self.min_sharpness = min_sharpness
+        self.min_face_size = min_face_size
+        self.brightness_range = brightness_range
+        self.max_similarity = max_similarity
+        self.target_samples = target_samples
+        self.max_samples = max_samples
+        self.max_frames = max_frames
+        self.samples = []
+        self.signatures = np.empty((0, SIGNATURE_SIZE[0] * SIGNATURE_SIZE[1]), dtype=np.float32)
+        self.frames = 0
+        self.rejected = {'size': 0, 'blur': 0, 'brightness': 0, 'duplicate': 0}
+
+    def quality(self, face, size):
+        """Return (sharpness, brightness, size) for a normalized crop."""
+        sharpness = cv2.Laplacian(face, cv2.CV_64F).var()
+        return sharpness, float(face.mean()), size
+
+    def similarity(self, signature):
+        if not len(self.signatures):
+            return 0.0
+        return float(np.max(self.signatures @ signature))
+
+    def offer(self, face):
+        """Score a grayscale crop and keep it if it passes every gate. Returns the reject reason or None."""
+        size = min(face.shape[:2])
+        if size < self.min_face_size:
+            return self._reject('size')
+
+        face = normalize_face(face)
+        sharpness, brightness, size = self.quality(face, size)
+        if sharpness < self.min_sharpness:
+            return self._reject('blur')
+        if not self.brightness_range[0] <= brightness <= self.brightness_range[1]:
+            return self._reject('brightness')
+
+        signature = face_signature(face)
+        if self.similarity(signature) >= self.max_similarity:
+            return self._reject('duplicate')
+
+        self.samples.append(face)
+        self.signatures = np.vstack([self.signatures, signature])
+        return None
+
+    def end_frame(self):
+        self.frames += 1
+
+    def done(self):
+        kept = len(self.samples)
+        if self.target_samples is not None and kept >= self.target_samples:
+            return True
+        return kept >= self.max_samples or (self.max_frames is not None and self.frames >= self.max_frames)
+
+    def stats(self):
+        return {'frames': self.frames, 'kept': len(self.samples), 'rejected': dict(self.rejected)}
+
+    def _reject(self, reason):
+        self.rejected[reason] += 1
+        return reason
@@ -1,38 +1,78 @@
 import cv2
 import os
+from app.detection import FaceDetector, FaceTracker
+from app.enrollment import EnrollmentSelector
+from app.frame_scheduler import create_scheduler
+from app.frame_source import FrameSource, open_frame_source
+from app.metrics import get_metrics
+from app.model_registry import get_model_registry
+from app.sample_store import FaceSampleStore
 
-def register_face(face_id):
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+def register_face(face_id, source=0, show=True, tracking=True, selector=None, scheduler=None):
+    if selector is None:
+        selector = EnrollmentSelector()
+    if scheduler is None:
+        scheduler = create_scheduler()
+    metrics = get_metrics()
+    face_cascade = get_model_registry().get_cascade()
+    tracker = FaceTracker(FaceDetector(face_cascade), redetect_every=10 if tracking else 0)
+    scheduler.attach(tracker.detector)
+    shown_faces = []
 
     if not os.path.exists('data'):
         os.makedirs('data')
 
-    cap = cv2.VideoCapture(0)
-    count = 0
+    cap = open_frame_source(source)
 
     while True:
-        ret, frame = cap.read()
+        with metrics.stage('register_face.read'):
+            ret, frame = cap.read()
         if not ret:
             print("The camera cannot be accessed!")
             break
+        metrics.count('register_face.frames')
+        scheduler.begin_frame()
 
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+        if scheduler.should_detect():
+            with metrics.stage('register_face.convert'):
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            with metrics.stage('register_face.detect'):
+                faces = scheduler.limit_faces(tracker.detect(gray))
+            metrics.count('register_face.faces', len(faces))
 
-        for (x, y, w, h) in faces:
-            cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
-            face = gray[y:y + h, x:x + w]
-            cv2.imwrite(f"data/User.{face_id}.{count}.jpg", face)
-            count += 1
+            shown_faces = []
+            for (x, y, w, h) in faces:
+                with metrics.stage('register_face.quality'):
+                    rejected = selector.offer(gray[y:y + h, x:x + w])
+                metrics.count('register_face.samples_kept' if rejected is None
+                              else f'register_face.rejected_{rejected}')
+                shown_faces.append(((x, y, w, h), (255, 0, 0) if rejected is None else (0, 0, 255)))
+        for (x, y, w, h), color in shown_faces:
+            cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+        selector.end_frame()
 
-        cv2.imshow('Face Register', frame)
+        key = None
+        if show:
+            with metrics.stage('register_face.display'):
+                cv2.imshow('Face Register', frame)
+                key = cv2.waitKey(1) & 0xFF
+        scheduler.end_frame()
 
-        if count >= 70:
+        if selector.done() or key == ord('q'):
             break
 
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-
-    cap.release()
-    cv2.destroyAllWindows()
+    if not isinstance(source, FrameSource):
+        cap.release()
+    if show:
+        cv2.destroyAllWindows()
+    stats = selector.stats()
+    print(f"Enrollment kept {stats['kept']} samples from {stats['frames']} frames, rejected: {stats['rejected']}")
+    if scheduler.target_fps:
+        print(f"Scheduler stats: {scheduler.stats()}")
+    if not selector.samples:
+        print("No usable face samples were captured; existing facial data was kept.")
+        return 0
+    with metrics.stage('register_face.save'):
+        FaceSampleStore().replace_samples(face_id, selector.samples)
     print("Facial data was successfully recorded.")
+    return len(selector.samples)
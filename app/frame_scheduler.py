@@ -0,0 +1,158 @@
+import time
+
+# Frame rate the login and enrollment loops try to hold. None processes every
+# frame at full quality, as fast as the machine allows.
+TARGET_FPS = None
+
+# Degradation levels, cheapest last: (detect every Nth frame, multiplier on
+# the detector's own downscale factor, most faces recognized per frame).
+LEVELS = (
+    (1, 1.0, None),
+    (1, 0.8, 4),
+    (2, 0.8, 3),
+    (2, 0.6, 2),
+    (3, 0.6, 2),
+    (3, 0.5, 1),
+    (4, 0.5, 1),
+)
+# Weight of the newest frame in the smoothed per-frame cost.
+SMOOTHING = 0.1
+# Frames to wait after a level change before judging the new level.
+HOLD_FRAMES = 15
+# Step back up only while the smoothed cost stays below this share of the frame budget.
+UPGRADE_HEADROOM = 0.6
+MAX_UPGRADE_HOLD = 32 * HOLD_FRAMES
+
+_target_fps = TARGET_FPS
+
+
+def set_target_fps(fps):
+    """Default target for schedulers made by create_scheduler(); None turns adaptation off."""
+    global _target_fps
+    _target_fps = fps or None
+
+
+def create_scheduler(target_fps=None):
+    return AdaptiveFrameScheduler(target_fps or _target_fps)
+
+
+class AdaptiveFrameScheduler:
+    """Trades detection work for frame rate when processing falls behind.
+
+    The loop calls begin_frame() once a frame has been read and end_frame()
+    after it was processed and shown, so waiting for the camera is not
+    counted. The smoothed per-frame cost is compared with 1 / target_fps:
+    while it is over budget the scheduler moves one step down LEVELS (less
+    frequent detection, a smaller detection image, fewer faces sent to
+    recognition), and while it stays well under budget it moves back up.
+    A level that was left for being too slow soon after an upgrade doubles
+    the wait before the next upgrade, so the scheduler settles instead of
+    bouncing between two levels. Without a target it stays on the first
+    level and only measures.
+    """
+
+    def __init__(self, target_fps=TARGET_FPS, levels=LEVELS, hold_frames=HOLD_FRAMES):
+        self.target_fps = target_fps
+        self.levels = levels
+        self.hold_frames = hold_frames
+        self.level = 0
+        self.cost = None
+        self.detector = None
+        self.base_scale = None
+        self.frames = 0
+        self.detections = 0
+        self.skipped_detections = 0
+        self.faces_dropped = 0
+        self.downgrades = 0
+        self.upgrades = 0
+        self._frame_started = None
+        self._since_change = 0
+        self._since_detect = None
+        self._upgrade_hold = hold_frames
+        self._last_upgrade = None
+
+    @property
+    def detect_every(self):
+        return self.levels[self.level][0]
+
+    @property
+    def scale(self):
+        return self.levels[self.level][1]
+
+    @property
+    def max_faces(self):
+        return self.levels[self.level][2]
+
+    def attach(self, detector):
+        """Let the scheduler scale this FaceDetector's downscale factor."""
+        self.detector = detector
+        self.base_scale = detector.scale
+        self._apply()
+
+    def begin_frame(self):
+        self._frame_started = time.perf_counter()
+
+    def should_detect(self):
+        """True when this frame should run detection and recognition."""
+        if self._since_detect is None or self._since_detect + 1 >= self.detect_every:
+            self._since_detect = 0
+            self.detections += 1
+            return True
+        self._since_detect += 1
+        self.skipped_detections += 1
+        return False
+
+    def limit_faces(self, faces):
+        """Keep the largest max_faces faces."""
+        limit = self.max_faces
+        if limit is None or len(faces) <= limit:
+            return faces
+        self.faces_dropped += len(faces) - limit
+        return sorted(faces, key=lambda box: box[2] * box[3], reverse=True)[:limit]
+
+    def end_frame(self):
+        if self._frame_started is None:
+            return
+        cost = time.perf_counter() - self._frame_started
+        self._frame_started = None
+        self.cost = cost if self.cost is None else self.cost + SMOOTHING * (cost - self.cost)
+        self.frames += 1
+        self._since_change += 1
+        if not self.target_fps:
+            return
+
+        budget = 1.0 / self.target_fps
+        if self.cost > budget and self.level < len(self.levels) - 1 and self._since_change >= self.hold_frames:
+            if self._last_upgrade is not None and self.frames - self._last_upgrade <= 2 * self.hold_frames:
+                self._upgrade_hold = min(self._upgrade_hold * 2, MAX_UPGRADE_HOLD)
+            self._set_level(self.level + 1)
+            self.downgrades += 1
+        elif self.cost < budget * UPGRADE_HEADROOM and self.level > 0 and self._since_change >= self._upgrade_hold:
+            self._set_level(self.level - 1)
+            self.upgrades += 1
+            self._last_upgrade = self.frames
+
+    def stats(self):
+        return {
+            'target_fps': self.target_fps,
+            'level': self.level,
+            'detect_every': self.detect_every,
+            'detection_scale': self.detector.scale if self.detector is not None else None,
+            'max_faces': self.max_faces,
+            'frame_cost_ms': (self.cost or 0.0) * 1000,
+            'frames': self.frames,
+            'detections': self.detections,
+            'skipped_detections': self.skipped_detections,
+            'faces_dropped': self.faces_dropped,
+            'downgrades': self.downgrades,
+            'upgrades': self.upgrades,
+        }
+
+    def _set_level(self, level):
+        self.level = level
+        self._since_change = 0
+        self._apply()
+
+    def _apply(self):
+        if self.detector is not None:
+            self.detector.scale = self.base_scale * self.scale
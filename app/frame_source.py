@@ -0,0 +1,176 @@
+import cv2
+import os
+import threading
+import time
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+class FrameSource:
+    """Anything the login and enrollment loops can pull BGR frames from.
+
+    read() follows cv2.VideoCapture and returns (ret, frame); ret is False
+    once the source is exhausted or the device stops delivering frames.
+    """
+
+    def __init__(self, realtime=False, fps=None):
+        self.realtime = realtime
+        self.fps = fps
+        self.frames_read = 0
+        self._next_frame_time = None
+
+    def read(self):
+        ret, frame = self._read()
+        if ret:
+            self.frames_read += 1
+            self._pace()
+        return ret, frame
+
+    def _read(self):
+        raise NotImplementedError
+
+    def _pace(self):
+        if not self.realtime or not self.fps:
+            return
+        now = time.perf_counter()
+        if self._next_frame_time is None:
+            self._next_frame_time = now
+        delay = self._next_frame_time - now
+        if delay > 0:
+            time.sleep(delay)
+        self._next_frame_time = max(self._next_frame_time, now) + 1.0 / self.fps
+
+    def release(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class CameraSource(FrameSource):
+    def __init__(self, index=0):
+        super().__init__()
+        self.index = index
+        self.cap = cv2.VideoCapture(index)
+
+    def _read(self):
+        return self.cap.read()
+
+    def release(self):
+        self.cap.release()
+
+
+class VideoFileSource(FrameSource):
+    def __init__(self, path, realtime=False):
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise IOError(f"Cannot open video file: {path}")
+        super().__init__(realtime=realtime, fps=self.cap.get(cv2.CAP_PROP_FPS) or 30.0)
+
+    def _read(self):
+        return self.cap.read()
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageFolderSource(FrameSource):
+    def __init__(self, path, realtime=False, fps=30.0):
+        super().__init__(realtime=realtime, fps=fps)
+        self.path = path
+        self.image_paths = sorted(os.path.join(path, f) for f in os.listdir(path)
+                                  if f.lower().endswith(IMAGE_EXTENSIONS))
+        self.position = 0
+
+    def _read(self):
+        while self.position < len(self.image_paths):
+            frame = cv2.imread(self.image_paths[self.position])
+            self.position += 1
+            if frame is not None:
+                return True, frame
+        return False, None
+
+
+class ThreadedFrameSource(FrameSource):
+    """Reads another source on a background thread into a one-frame slot.
+
+    A frame that has not been consumed when the next one arrives is dropped,
+    so read() always returns the freshest frame. File and folder sources
+    should be paced with realtime=True, otherwise most of them are dropped.
+    """
+
+    def __init__(self, source, release_source=True):
+        super().__init__()
+        self.source = source
+        self.release_source = release_source
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self._slot = None
+        self._finished = False
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._capture, daemon=True)
+        self._thread.start()
+
+    def _capture(self):
+        while not self._stopped:
+            ret, frame = self.source.read()
+            with self._condition:
+                if not ret:
+                    self._finished = True
+                    self._condition.notify_all()
+                    return
+                if self._slot is not None:
+                    self.frames_dropped += 1
+                self._slot = (frame, time.perf_counter())
+                self.frames_captured += 1
+                self._condition.notify_all()
+
+    def _read(self):
+        with self._condition:
+            while self._slot is None and not self._finished and not self._stopped:
+                self._condition.wait(0.5)
+            if self._slot is None:
+                return False, None
+            frame, captured_at = self._slot
+            self._slot = None
+
+        latency = time.perf_counter() - captured_at
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        return True, frame
+
+    def stats(self):
+        consumed = self.frames_read
+        return {
+            'frames_captured': self.frames_captured,
+            'frames_read': consumed,
+            'frames_dropped': self.frames_dropped,
+            'queue_latency_mean_ms': (self.latency_total / consumed * 1000) if consumed else 0.0,
+            'queue_latency_max_ms': self.latency_max * 1000,
+        }
+
+    def release(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self._thread.join(timeout=2.0)
+        if self.release_source:
+            self.source.release()
+
+
+def open_frame_source(source=0, realtime=False):
+    """Build a FrameSource from a device index, a video file or an image folder."""
+    if isinstance(source, FrameSource):
+        return source
+    if isinstance(source, int) or (isinstance(source, str) and source.isdigit()):
+        return CameraSource(int(source))
+    if os.path.isdir(source):
+        return ImageFolderSource(source, realtime=realtime)
+    return VideoFileSource(source, realtime=realtime)
@@ -0,0 +1,283 @@
+import cv2
+import numpy as np
+
+RADIUS = 1
+NEIGHBORS = 8
+GRID = (8, 8)
+DISTANCE_CHUNK = 2048
+_EPSILON = np.finfo(np.float32).eps
+
+
+def _neighbor_offsets(radius, neighbors):
+    offsets = []
+    for n in range(neighbors):
+        x = float(radius) * np.cos(2.0 * np.pi * n / neighbors)
+        y = -float(radius) * np.sin(2.0 * np.pi * n / neighbors)
+        fx, fy = int(np.floor(x)), int(np.floor(y))
+        cx, cy = int(np.ceil(x)), int(np.ceil(y))
+        tx, ty = np.float32(x - fx), np.float32(y - fy)
+        weights = (np.float32((1 - tx) * (1 - ty)), np.float32(tx * (1 - ty)),
+                   np.float32((1 - tx) * ty), np.float32(tx * ty))
+        offsets.append(((fy, fx), (fy, cx), (cy, fx), (cy, cx), weights))
+    return offsets
+
+
+def lbp_codes(gray, radius=RADIUS, neighbors=NEIGHBORS):
+    """Extended (circular) LBP codes, computed the way OpenCV's LBPH does."""
+    src = np.asarray(gray, dtype=np.float32)
+    rows, cols = src.shape
+    center = src[radius:rows - radius, radius:cols - radius]
+    codes = np.zeros(center.shape, dtype=np.int32)
+
+    def shifted(dy, dx):
+        return src[radius + dy:rows - radius + dy, radius + dx:cols - radius + dx]
+
+    for n, (p1, p2, p3, p4, (w1, w2, w3, w4)) in enumerate(_neighbor_offsets(radius, neighbors)):
+        t = w1 * shifted(*p1) + w2 * shifted(*p2) + w3 * shifted(*p3) + w4 * shifted(*p4)
+        codes |= (((t > center) | (np.abs(t - center) < _EPSILON)).astype(np.int32) << n)
+    return codes
+
+
+def spatial_histogram(gray, radius=RADIUS, neighbors=NEIGHBORS, grid=GRID):
+    """Concatenated per-cell LBP histograms, each normalized to sum to 1."""
+    if gray.ndim == 3:
+        gray = cv2.cvtColor(gray, cv2.COLOR_BGR2GRAY)
+    codes = lbp_codes(gray, radius, neighbors)
+    bins = 2 ** neighbors
+    grid_x, grid_y = grid
+    height, width = codes.shape[0] // grid_y, codes.shape[1] // grid_x
+    cells = codes[:grid_y * height, :grid_x * width]
+    cells = cells.reshape(grid_y, height, grid_x, width).transpose(0, 2, 1, 3).reshape(grid_y * grid_x, -1)
+    offsets = (np.arange(grid_y * grid_x) * bins)[:, None]
+    hist = np.bincount((cells + offsets).ravel(), minlength=grid_y * grid_x * bins).astype(np.float32)
+    if height * width:
+        hist /= height * width
+    return hist
+
+
+def _gather(matrix, bins, samples, start, sample_major):
+    """The probe's non-zero bins for one chunk of gallery samples, as a bins x samples block."""
+    if sample_major:
+        rows = matrix[start:start + DISTANCE_CHUNK] if samples is None else matrix.take(
+            samples[start:start + DISTANCE_CHUNK], axis=0)
+        return rows.take(bins, axis=1).T
+    if samples is None:
+        return matrix[bins, start:start + DISTANCE_CHUNK]
+    return matrix[np.ix_(bins, samples[start:start + DISTANCE_CHUNK])]
+
+
+def chi_square(matrix, sample_sums, probe, samples=None, sample_major=False):
+    """OpenCV's HISTCMP_CHISQR_ALT distance from probe to every gallery column.
+
+    2 * sum((a - b)^2 / (a + b)) is rewritten as
+    2 * (sum(a) + sum(b)) - 8 * sum(a * b / (a + b)); the last sum is zero
+    wherever the probe bin is empty, so only the probe's non-zero bins are
+    read from the gallery. The gallery matrix holds one sample per column,
+    or per row when sample_major is set; samples restricts the search to
+    those sample positions.
+    """
+    bins = np.flatnonzero(probe)
+    values = probe[bins][:, None]
+    if samples is not None:
+        sample_sums = sample_sums[samples]
+    distances = np.empty(len(sample_sums), dtype=np.float64)
+    for start in range(0, len(sample_sums), DISTANCE_CHUNK):
+        block = _gather(matrix, bins, samples, start, sample_major)
+        overlap = (block * values / (block + values)).sum(axis=0, dtype=np.float64)
+        distances[start:start + block.shape[1]] = (
+            2.0 * (sample_sums[start:start + block.shape[1]] + float(values.sum())) - 8.0 * overlap)
+    return np.maximum(distances, 0.0, out=distances)
+
+
+def intersection(matrix, sample_sums, probe, samples=None, sample_major=False):
+    """Histogram intersection turned into a distance (gallery mass minus overlap, 0 when identical)."""
+    bins = np.flatnonzero(probe)
+    values = probe[bins][:, None]
+    if samples is not None:
+        sample_sums = sample_sums[samples]
+    distances = np.empty(len(sample_sums), dtype=np.float64)
+    for start in range(0, len(sample_sums), DISTANCE_CHUNK):
+        block = _gather(matrix, bins, samples, start, sample_major)
+        overlap = np.minimum(block, values).sum(axis=0, dtype=np.float64)
+        distances[start:start + block.shape[1]] = sample_sums[start:start + block.shape[1]] - overlap
+    return distances
+
+
+DISTANCES = {'chisqr': chi_square, 'intersection': intersection}
+
+
+class NumpyLBPHRecognizer:
+    """LBPH face recognizer that scores probes with vectorized NumPy distances.
+
+    Follows the cv2.face.LBPHFaceRecognizer interface used in this project
+    (train, update, predict, read, save) and builds the same histograms, so
+    with the default 'chisqr' distance predict() returns the same label and
+    confidence as OpenCV. All training histograms are kept in one
+    contiguous float32 matrix, one column per sample in training order, so
+    a probe only has to gather the rows of its non-zero bins.
+    predict_batch() scores several probes in one call. When `prefilter` is
+    set, each probe is first compared with the per-user mean histograms
+    and only the samples of the `prefilter` closest users are searched.
+    An approximate index (see app.ann_index) can be attached with
+    set_index(); the exact distance is then only computed for the
+    candidates it returns, and samples are stored one per row instead.
+    """
+
+    def __init__(self, radius=RADIUS, neighbors=NEIGHBORS, grid=GRID, distance='chisqr', prefilter=None, index=None):
+        self.radius = radius
+        self.neighbors = neighbors
+        self.grid = grid
+        self.distance = distance
+        self.prefilter = prefilter
+        self.index = index
+        self.sample_major = index is not None
+        self._set(np.empty((0, grid[0] * grid[1] * 2 ** neighbors), dtype=np.float32), np.empty(0, dtype=np.int32))
+
+    @classmethod
+    def from_cv2(cls, recognizer, **kwargs):
+        """Copy the histograms and labels out of a trained cv2 LBPH recognizer."""
+        engine = cls(radius=recognizer.getRadius(), neighbors=recognizer.getNeighbors(),
+                     grid=(recognizer.getGridX(), recognizer.getGridY()), **kwargs)
+        histograms = recognizer.getHistograms()
+        if len(histograms):
+            engine._set(np.vstack([h.reshape(1, -1) for h in histograms]), recognizer.getLabels().ravel())
+        return engine
+
+    @property
+    def histograms(self):
+        """Training histograms as rows (a view of the gallery matrix)."""
+        return self.matrix if self.sample_major else self.matrix.T
+
+    def set_index(self, index):
+        """Attach an approximate index and store samples as rows, which suits scoring scattered candidates."""
+        self.index = index
+        if index is not None and not self.sample_major:
+            histograms = self.histograms
+            self.sample_major = True
+            self._set(histograms, self.labels)
+
+    def histogram(self, face):
+        return spatial_histogram(face, self.radius, self.neighbors, self.grid)
+
+    def train(self, faces, labels):
+        self._set(self.histograms[:0], self.labels[:0])
+        self.update(faces, labels)
+
+    def update(self, faces, labels):
+        labels = np.asarray(labels, dtype=np.int32).ravel()
+        if len(faces) != len(labels):
+            raise ValueError("faces and labels must have the same length")
+        if not len(faces):
+            return
+        histograms = np.vstack([self.histogram(face) for face in faces])
+        self._set(np.vstack([self.histograms, histograms]), np.concatenate([self.labels, labels]))
+
+    def predict(self, face):
+        labels, confidences = self.predict_batch([face])
+        return int(labels[0]), float(confidences[0])
+
+    def predict_batch(self, faces):
+        """Return (labels, distances) arrays with the nearest training sample for each face."""
+        return self.predict_histograms([self.histogram(face) for face in faces])
+
+    def predict_histograms(self, probes):
+        count = len(probes)
+        labels = np.full(count, -1, dtype=np.int32)
+        distances = np.full(count, np.finfo(np.float64).max, dtype=np.float64)
+        if not len(self.labels):
+            return labels, distances
+        metric = DISTANCES[self.distance]
+        index = self.index if self.index is not None and self.index.size == len(self.labels) else None
+        prefilter = self.prefilter and self.prefilter < len(self.user_labels)
+
+        for i, probe in enumerate(probes):
+            if index is not None:
+                rows = index.candidates(probe)
+                if not len(rows):
+                    continue
+                scores = metric(self.matrix, self.sample_sums, probe, rows, self.sample_major)
+            elif prefilter:
+                centroids, centroid_sums = self._centroids()
+                user_scores = metric(centroids, centroid_sums, probe)
+                users = np.argpartition(user_scores, self.prefilter - 1)[:self.prefilter]
+                rows = np.concatenate([self.user_rows[self.user_slices[u]:self.user_slices[u + 1]] for u in users])
+                scores = metric(self.matrix, self.sample_sums, probe, rows, self.sample_major)
+            else:
+                rows = None
+                scores = metric(self.matrix, self.sample_sums, probe, sample_major=self.sample_major)
+            best = int(scores.argmin())
+            labels[i] = self.labels[best if rows is None else rows[best]]
+            distances[i] = scores[best]
+        return labels, distances
+
+    def read(self, path):
+        """Load a trainer.yml written by OpenCV (or by save()), or a binary .lbph model.
+
+        A binary model is memory-mapped and used as it is, without copying
+        the histograms.
+        """
+        from app.model_format import BINARY_SUFFIX, LAYOUT_ROWS, read_binary_model, read_yml_model
+
+        if path.endswith(BINARY_SUFFIX):
+            params, matrix, sums, labels = read_binary_model(path)
+            self.radius, self.neighbors, self.grid = params['radius'], params['neighbors'], params['grid']
+            self.sample_major = params['layout'] == LAYOUT_ROWS
+            if not len(labels):
+                self._set(np.empty((0, self.grid[0] * self.grid[1] * 2 ** self.neighbors), np.float32), labels)
+                return
+            self.matrix, self.sample_sums, self.labels = matrix, sums, labels
+            self._index_users()
+            return
+
+        params, histograms, labels = read_yml_model(path)
+        self.radius, self.neighbors, self.grid = params['radius'], params['neighbors'], params['grid']
+        self._set(histograms, labels)
+
+    def save(self, path):
+        """Write the model as a binary .lbph file, or in OpenCV's trainer.yml layout so cv2 can read it back."""
+        from app.model_format import BINARY_SUFFIX, LAYOUT_COLUMNS, LAYOUT_ROWS, write_binary_model
+
+        if path.endswith(BINARY_SUFFIX):
+            write_binary_model(path, self.histograms, self.labels, self.radius, self.neighbors, self.grid,
+                               LAYOUT_ROWS if self.sample_major else LAYOUT_COLUMNS)
+            return
+        storage = cv2.FileStorage(path, cv2.FILE_STORAGE_WRITE)
+        storage.startWriteStruct('opencv_lbphfaces', cv2.FILE_NODE_MAP)
+        storage.write('threshold', float(np.finfo(np.float64).max))
+        storage.write('radius', self.radius)
+        storage.write('neighbors', self.neighbors)
+        storage.write('grid_x', self.grid[0])
+        storage.write('grid_y', self.grid[1])
+        storage.startWriteStruct('histograms', cv2.FILE_NODE_SEQ)
+        for histogram in self.histograms:
+            storage.write('', histogram.reshape(1, -1))
+        storage.endWriteStruct()
+        storage.write('labels', self.labels.reshape(-1, 1))
+        storage.startWriteStruct('labelsInfo', cv2.FILE_NODE_SEQ)
+        storage.endWriteStruct()
+        storage.endWriteStruct()
+        storage.release()
+
+    def _set(self, histograms, labels):
+        histograms = np.asarray(histograms, dtype=np.float32)
+        self.matrix = np.ascontiguousarray(histograms if self.sample_major else histograms.T)
+        self.labels = np.ascontiguousarray(labels, dtype=np.int32)
+        self.sample_sums = histograms.sum(axis=1, dtype=np.float64)
+        self._index_users()
+
+    def _index_users(self):
+        # Samples grouped by user for the centroid pre-filter; the mean histograms are built on first use.
+        self.user_rows = np.argsort(self.labels, kind='stable')
+        self.user_labels, starts = np.unique(self.labels[self.user_rows], return_index=True)
+        self.user_slices = np.append(starts, len(self.labels))
+        self._centroid_cache = None
+
+    def _centroids(self):
+        if self._centroid_cache is None:
+            histograms = self.histograms
+            centroids = np.empty((histograms.shape[1], len(self.user_labels)), dtype=np.float32)
+            for u in range(len(self.user_labels)):
+                rows = self.user_rows[self.user_slices[u]:self.user_slices[u + 1]]
+                centroids[:, u] = histograms[rows].mean(axis=0)
+            self._centroid_cache = centroids, centroids.sum(axis=0, dtype=np.float64)
+        return self._centroid_cache
@@ -0,0 +1,176 @@
+import atexit
+import bisect
+import json
+import os
+import signal
+import threading
+import time
+
+# Upper bounds of the latency histogram buckets, in milliseconds; the last bucket is open-ended.
+BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ('metrics', 'name', 'started')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class StageHistogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, ms):
+        self.count += 1
+        self.total += ms
+        self.min = ms if self.min is None else min(self.min, ms)
+        self.max = max(self.max, ms)
+        self.buckets[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of samples (max for the open bucket)."""
+        target = fraction * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= target:
+                return min(BUCKETS_MS[i], self.max) if i < len(BUCKETS_MS) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total_ms': self.total,
+            'mean_ms': self.total / self.count if self.count else 0.0,
+            'min_ms': self.min or 0.0,
+            'max_ms': self.max,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'buckets': {('le_' + str(bound)) if i < len(BUCKETS_MS) else 'inf': n
+                        for i, (bound, n) in enumerate(zip(BUCKETS_MS + (None,), self.buckets)) if n},
+        }
+
+
+class Metrics:
+    """Opt-in per-stage latency histograms and counters for the face loops.
+
+    While disabled, stage() hands back a shared no-op context manager and
+    count() returns at once, so instrumented loops pay one attribute check
+    per call. Stage names are dotted, e.g. 'face_login.detect'.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._counters = {}
+        self._started = time.time()
+
+    def enable(self, path=None, dump_at_exit=True):
+        """Start recording; with a path, the report is written there at exit and on dump()."""
+        self.enabled = True
+        self.path = path
+        if path and dump_at_exit:
+            atexit.register(self.dump)
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+            self._counters = {}
+            self._started = time.time()
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def record(self, name, seconds):
+        with self._lock:
+            histogram = self._stages.get(name)
+            if histogram is None:
+                histogram = self._stages[name] = StageHistogram()
+            histogram.add(seconds * 1000)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self._started)),
+                'elapsed_s': time.time() - self._started,
+                'stages': {name: histogram.to_dict() for name, histogram in sorted(self._stages.items())},
+                'counters': dict(sorted(self._counters.items())),
+            }
+
+    def dump(self, path=None):
+        """Write the snapshot as JSON to path (or the enable() path); print it when there is neither."""
+        path = path or self.path
+        text = json.dumps(self.snapshot(), indent=2)
+        if not path:
+            print(text)
+            return None
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            file.write(text)
+        os.replace(tmp_path, path)
+        return path
+
+    def install_signal_handler(self, signum=None):
+        """Dump the report whenever the process receives signum (SIGUSR1 where it exists)."""
+        if signum is None:
+            signum = getattr(signal, 'SIGUSR1', None) or getattr(signal, 'SIGBREAK', None)
+        if signum is None:
+            return False
+
+        def _dump():
+            path = self.dump()
+            if path:
+                print(f"Metrics written to {path}")
+
+        def _handler(received, frame):
+            # The interrupted code may hold the lock, so dump from another thread.
+            threading.Thread(target=_dump, daemon=True).start()
+
+        signal.signal(signum, _handler)
+        return True
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    return _metrics
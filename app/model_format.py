@@ -0,0 +1,181 @@
+import cv2
+import os
+import struct
+import numpy as np
+
+BINARY_SUFFIX = '.lbph'
+MAGIC = b'LBPHBIN\0'
+VERSION = 1
+# magic, version, radius, neighbors, grid_x, grid_y, layout, count, dims
+HEADER = struct.Struct('<8sIIIIIIQQ')
+HEADER_SIZE = 64
+ALIGNMENT = 64
+LAYOUT_COLUMNS = 0
+LAYOUT_ROWS = 1
+
+
+def binary_model_path(model_path):
+    """trainer.yml -> trainer.lbph, next to the model."""
+    return os.path.splitext(model_path)[0] + BINARY_SUFFIX
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _offsets(count, dims):
+    matrix = HEADER_SIZE
+    sums = _align(matrix + count * dims * 4)
+    labels = _align(sums + count * 8)
+    return matrix, sums, labels, labels + count * 4
+
+
+def write_binary_model(path, histograms, labels, radius=1, neighbors=8, grid=(8, 8), layout=LAYOUT_COLUMNS):
+    """Write histograms (one row per sample) and labels in the binary model format.
+
+    The file is a 64-byte header followed by the float32 histogram matrix
+    (dims x count for LAYOUT_COLUMNS, count x dims for LAYOUT_ROWS), the
+    float64 per-sample histogram sums and the int32 labels, each aligned to
+    64 bytes, all little-endian. It is written next to path and renamed
+    into place.
+    """
+    histograms = np.asarray(histograms, dtype='<f4')
+    labels = np.asarray(labels, dtype='<i4').ravel()
+    count, dims = len(labels), (histograms.shape[1] if histograms.ndim == 2 else 0)
+    matrix_offset, sums_offset, labels_offset, end = _offsets(count, dims)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, radius, neighbors, grid[0], grid[1], layout, count, dims)
+                   .ljust(HEADER_SIZE, b'\0'))
+        if count:
+            matrix = histograms.T if layout == LAYOUT_COLUMNS else histograms
+            for start in range(0, matrix.shape[0], 1024):
+                file.write(np.ascontiguousarray(matrix[start:start + 1024]).tobytes())
+        file.write(b'\0' * (sums_offset - file.tell()))
+        file.write(histograms.sum(axis=1, dtype='<f8').tobytes() if count else b'')
+        file.write(b'\0' * (labels_offset - file.tell()))
+        file.write(labels.tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_binary_header(path):
+    with open(path, 'rb') as file:
+        header = file.read(HEADER_SIZE)
+    if len(header) < HEADER.size:
+        raise ValueError(f"Truncated model file: {path}")
+    magic, version, radius, neighbors, grid_x, grid_y, layout, count, dims = HEADER.unpack_from(header)
+    if magic != MAGIC:
+        raise ValueError(f"Not a binary LBPH model: {path}")
+    if version != VERSION:
+        raise ValueError(f"Unsupported binary model version {version}: {path}")
+    return {'radius': radius, 'neighbors': neighbors, 'grid': (grid_x, grid_y), 'layout': layout,
+            'count': count, 'dims': dims}
+
+
+def read_binary_model(path, mmap=True):
+    """Return (params, matrix, sums, labels) from a binary model.
+
+    With mmap the arrays are read-only views of the file, so nothing is
+    parsed and pages are only read when a search touches them.
+    """
+    params = read_binary_header(path)
+    count, dims, layout = params['count'], params['dims'], params['layout']
+    matrix_offset, sums_offset, labels_offset, end = _offsets(count, dims)
+    if os.path.getsize(path) < end:
+        raise ValueError(f"Truncated model file: {path}")
+
+    shape = (dims, count) if layout == LAYOUT_COLUMNS else (count, dims)
+    if mmap and count:
+        matrix = np.memmap(path, dtype='<f4', mode='r', offset=matrix_offset, shape=shape)
+        sums = np.memmap(path, dtype='<f8', mode='r', offset=sums_offset, shape=(count,))
+        labels = np.memmap(path, dtype='<i4', mode='r', offset=labels_offset, shape=(count,))
+    else:
+        with open(path, 'rb') as file:
+            data = file.read()
+        matrix = np.frombuffer(data, '<f4', count * dims, matrix_offset).reshape(shape)
+        sums = np.frombuffer(data, '<f8', count, sums_offset)
+        labels = np.frombuffer(data, '<i4', count, labels_offset)
+    return params, matrix, sums, labels
+
+
+def read_yml_model(path):
+    """Read histograms and labels from an OpenCV trainer.yml with cv2.FileStorage."""
+    storage = cv2.FileStorage(path, cv2.FILE_STORAGE_READ)
+    if not storage.isOpened():
+        raise IOError(f"Cannot open model file: {path}")
+    root = storage.getNode('opencv_lbphfaces')
+    params = {
+        'radius': int(root.getNode('radius').real()),
+        'neighbors': int(root.getNode('neighbors').real()),
+        'grid': (int(root.getNode('grid_x').real()), int(root.getNode('grid_y').real())),
+    }
+    node = root.getNode('histograms')
+    histograms = [node.at(i).mat().reshape(-1) for i in range(node.size())]
+    labels = root.getNode('labels').mat()
+    storage.release()
+    labels = np.empty(0, np.int32) if labels is None else labels.ravel().astype(np.int32)
+    dims = params['grid'][0] * params['grid'][1] * 2 ** params['neighbors']
+    histograms = np.vstack(histograms).astype(np.float32) if histograms else np.empty((0, dims), np.float32)
+    return params, histograms, labels
+
+
+def refresh_binary_model(model_path, recognizer):
+    """Rewrite trainer.lbph from a freshly trained cv2 recognizer, if a binary model is kept for model_path."""
+    binary_path = binary_model_path(model_path)
+    if not os.path.exists(binary_path):
+        return
+    try:
+        layout = read_binary_header(binary_path)['layout']
+    except ValueError:
+        layout = LAYOUT_COLUMNS
+    histograms = recognizer.getHistograms()
+    dims = recognizer.getGridX() * recognizer.getGridY() * 2 ** recognizer.getNeighbors()
+    histograms = np.vstack([h.reshape(1, -1) for h in histograms]) if len(histograms) else np.empty((0, dims), np.float32)
+    try:
+        write_binary_model(binary_path, histograms, recognizer.getLabels().ravel(), recognizer.getRadius(),
+                           recognizer.getNeighbors(), (recognizer.getGridX(), recognizer.getGridY()), layout)
+    except OSError as e:
+        # On Windows a model that is still memory-mapped cannot be replaced; trainer.yml stays authoritative.
+        print(f"Error writing binary face model: {e}")
+
+
+def yml_to_binary(yml_path, binary_path=None, layout=LAYOUT_COLUMNS):
+    binary_path = binary_path or binary_model_path(yml_path)
+    params, histograms, labels = read_yml_model(yml_path)
+    write_binary_model(binary_path, histograms, labels, params['radius'], params['neighbors'], params['grid'], layout)
+    return binary_path
+
+
+def binary_to_yml(binary_path, yml_path):
+    from app.lbph import NumpyLBPHRecognizer
+
+    engine = NumpyLBPHRecognizer()
+    engine.read(binary_path)
+    engine.save(yml_path)
+    return yml_path
+
+
+if __name__ == '__main__':
+    import argparse
+    from app.model_registry import MODEL_PATH
+
+    parser = argparse.ArgumentParser(description="Convert the face model between trainer.yml and the binary format")
+    parser.add_argument('command', choices=['to-binary', 'to-yml', 'info'])
+    parser.add_argument('--model', default=MODEL_PATH, help="trainer.yml path")
+    parser.add_argument('--binary', default=None, help="Binary model path (default: next to the model)")
+    parser.add_argument('--layout', choices=['columns', 'rows'], default='columns',
+                        help="columns suits exact search, rows suits the IVF index")
+    args = parser.parse_args()
+
+    binary = args.binary or binary_model_path(args.model)
+    if args.command == 'to-binary':
+        yml_to_binary(args.model, binary, LAYOUT_ROWS if args.layout == 'rows' else LAYOUT_COLUMNS)
+        print(f"{args.model} ({os.path.getsize(args.model) / 1e6:.1f} MB) -> {binary} "
+              f"({os.path.getsize(binary) / 1e6:.1f} MB)")
+    elif args.command == 'to-yml':
+        binary_to_yml(binary, args.model)
+        print(f"{binary} -> {args.model}")
+    else:
+        params, matrix, sums, labels = read_binary_model(binary)
+        print(f"{binary}: {len(labels)} samples, {len(np.unique(labels))} users, {params}")
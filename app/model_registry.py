@@ -0,0 +1,141 @@
+import cv2
+import os
+import threading
+import numpy as np
+from app.detection import CASCADE_PATH
+
+MODEL_PATH = os.path.join('data', 'trainer.yml')
+
+# 'cv2' uses OpenCV's LBPHFaceRecognizer, 'numpy' the vectorized engine in app.lbph,
+# 'ivf' the same engine searching only the candidates of the index in app.ann_index.
+RECOGNIZER_ENGINES = ('cv2', 'numpy', 'ivf')
+RECOGNIZER_ENGINE = 'cv2'
+
+
+class ModelRegistry:
+    """Loads the face cascade and LBPH recognizer once and shares them.
+
+    get_recognizer() stats trainer.yml on every call and reloads it when its
+    mtime or size changed. The new recognizer is fully read before it
+    replaces the old one, so callers never see a half-loaded model.
+    Every recognizer engine reads the same trainer.yml, but the NumPy
+    engines memory-map trainer.lbph instead when it is at least as new. The
+    'ivf' engine also loads trainer.ivf.npz and builds it when it is
+    missing or does not match the model.
+    """
+
+    def __init__(self, model_path=MODEL_PATH, engine=RECOGNIZER_ENGINE):
+        self.model_path = model_path
+        self.engine = engine
+        self._lock = threading.Lock()
+        self._cascade = None
+        self._recognizer = None
+        self._model_stamp = None
+
+    def get_cascade(self):
+        if self._cascade is None:
+            with self._lock:
+                if self._cascade is None:
+                    self._cascade = cv2.CascadeClassifier(CASCADE_PATH)
+        return self._cascade
+
+    def get_recognizer(self):
+        stamp = self._stamp()
+        if stamp is None:
+            return None
+        if stamp == self._model_stamp and self._recognizer is not None:
+            return self._recognizer
+
+        with self._lock:
+            if stamp != self._model_stamp or self._recognizer is None:
+                recognizer = self._create_recognizer()
+                try:
+                    recognizer.read(self._read_path())
+                except (cv2.error, OSError, ValueError) as e:
+                    print(f"Error loading face model: {e}")
+                    return self._recognizer
+                if self.engine == 'ivf':
+                    self._attach_index(recognizer)
+                self._recognizer = recognizer
+                self._model_stamp = stamp
+            return self._recognizer
+
+    def publish(self, recognizer, model_path=None):
+        """Hand over a freshly trained recognizer that was just saved to model_path."""
+        if model_path and os.path.abspath(model_path) != os.path.abspath(self.model_path):
+            return
+        if self.engine != 'cv2' and isinstance(recognizer, cv2.face.LBPHFaceRecognizer):
+            from app.lbph import NumpyLBPHRecognizer
+            recognizer = NumpyLBPHRecognizer.from_cv2(recognizer)
+            if self.engine == 'ivf':
+                self._attach_index(recognizer)
+        elif self.engine == 'cv2' and not isinstance(recognizer, cv2.face.LBPHFaceRecognizer):
+            self.invalidate()
+            return
+        with self._lock:
+            self._recognizer = recognizer
+            self._model_stamp = self._stamp()
+
+    def set_engine(self, engine):
+        if engine not in RECOGNIZER_ENGINES:
+            raise ValueError(f"Unknown recognizer engine: {engine}")
+        with self._lock:
+            if engine != self.engine:
+                self.engine = engine
+                self._recognizer = None
+                self._model_stamp = None
+
+    def invalidate(self):
+        with self._lock:
+            self._recognizer = None
+            self._model_stamp = None
+
+    def _attach_index(self, recognizer):
+        from app.ann_index import IVFIndex, index_path
+
+        path = index_path(self.model_path)
+        index = None
+        if os.path.exists(path):
+            try:
+                index = IVFIndex.load(path)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Error loading face index: {e}")
+        if index is None or not np.array_equal(index.labels, recognizer.labels):
+            index = index or IVFIndex(neighbors=recognizer.neighbors)
+            index.reassign(recognizer.histograms, recognizer.labels)
+            index.save(path)
+        recognizer.set_index(index)
+
+    def _read_path(self):
+        """The NumPy engines load trainer.lbph instead of parsing trainer.yml when it is at least as new."""
+        if self.engine == 'cv2':
+            return self.model_path
+        from app.model_format import binary_model_path
+
+        binary_path = binary_model_path(self.model_path)
+        try:
+            if os.stat(binary_path).st_mtime_ns >= os.stat(self.model_path).st_mtime_ns:
+                return binary_path
+        except OSError:
+            pass
+        return self.model_path
+
+    def _create_recognizer(self):
+        if self.engine in ('numpy', 'ivf'):
+            from app.lbph import NumpyLBPHRecognizer
+            return NumpyLBPHRecognizer()
+        return cv2.face.LBPHFaceRecognizer_create()
+
+    def _stamp(self):
+        try:
+            stat = os.stat(self.model_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+
+_registry = ModelRegistry()
+
+
+def get_model_registry():
+    return _registry
@@ -0,0 +1,225 @@
+import cv2
+import threading
+import time
+from collections import deque
+from app.decision import ACCEPT, REJECT, VotingDecider
+from app.detection import FaceDetector, FaceTracker
+from app.frame_source import FrameSource, ThreadedFrameSource, open_frame_source
+from app.metrics import get_metrics
+from app.model_registry import get_model_registry
+from app.sample_store import normalize_face
+
+# Frames used for each stream's recent fps.
+FPS_WINDOW = 60
+
+
+def print_decision(stream, decision, user):
+    if decision.state == ACCEPT:
+        name = user.username if user is not None else "unknown user"
+        print(f"[{stream}] Face ID {decision.label} accepted: {name} (score {decision.score:.2f})")
+    else:
+        print(f"[{stream}] Face rejected as unknown.")
+
+
+class _Stream:
+    def __init__(self, name, source, tracking, decider):
+        self.name = name
+        self.source = source
+        self.tracker = FaceTracker(FaceDetector(), redetect_every=10 if tracking else 0)
+        self.decider = decider
+        self.cap = None
+        self.thread = None
+        self.reported = set()
+        self.frames = 0
+        self.faces = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.started = None
+        self.finished = None
+        self.frame_times = deque(maxlen=FPS_WINDOW)
+
+    def stats(self):
+        now = self.finished or time.perf_counter()
+        elapsed = now - self.started if self.started else 0.0
+        times = self.frame_times
+        recent = (len(times) - 1) / (times[-1] - times[0]) if len(times) > 1 and times[-1] > times[0] else 0.0
+        stats = {
+            'frames': self.frames,
+            'faces': self.faces,
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'fps': self.frames / elapsed if elapsed else 0.0,
+            'recent_fps': recent,
+            'running': self.thread is not None and self.thread.is_alive(),
+        }
+        stats.update(self.tracker.stats())
+        if isinstance(self.cap, ThreadedFrameSource):
+            stats.update(self.cap.stats())
+        return stats
+
+
+class MultiStreamRunner:
+    """Face recognition on several frame sources at once, in one process.
+
+    Every stream has its own capture thread (ThreadedFrameSource) and its own
+    worker thread running detection, tracking and a VotingDecider, while all
+    streams share the registry's recognizer and the repository's user index.
+    A track's first accept or reject is passed to
+    on_decision(stream_name, decision, user) on that stream's worker thread;
+    user is None for rejects and for face ids without a user. Streams keep
+    running after a decision, so one process can watch several doors.
+    """
+
+    def __init__(self, sources, repository=None, on_decision=print_decision, registry=None, tracking=True,
+                 decider_factory=VotingDecider, realtime=True):
+        if not isinstance(sources, dict):
+            named = {}
+            for i, source in enumerate(sources):
+                name = str(source) if not isinstance(source, FrameSource) else f"stream{i}"
+                named[name if name not in named else f"{name}#{i}"] = source
+            sources = named
+        self.repository = repository
+        self.on_decision = on_decision
+        self.registry = registry or get_model_registry()
+        self.realtime = realtime
+        self.streams = [_Stream(name, source, tracking, decider_factory()) for name, source in sources.items()]
+        self._stopped = threading.Event()
+        self._started = None
+
+    def start(self):
+        if self.registry.get_recognizer() is None:
+            print("Trainer File Not Found!")
+            return False
+        self._started = time.perf_counter()
+        for stream in self.streams:
+            try:
+                source = open_frame_source(stream.source, realtime=self.realtime)
+            except IOError as e:
+                print(f"[{stream.name}] {e}")
+                continue
+            stream.cap = ThreadedFrameSource(source, release_source=not isinstance(stream.source, FrameSource))
+            stream.started = time.perf_counter()
+            stream.thread = threading.Thread(target=self._run_stream, args=(stream,), name=f"stream-{stream.name}",
+                                             daemon=True)
+            stream.thread.start()
+        return True
+
+    def join(self, timeout=None):
+        """Wait for every stream to run out of frames; returns False if some are still running after timeout."""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        for stream in self.streams:
+            if stream.thread is not None:
+                stream.thread.join(None if deadline is None else max(0.0, deadline - time.perf_counter()))
+        return not any(stream.thread is not None and stream.thread.is_alive() for stream in self.streams)
+
+    def stop(self):
+        self._stopped.set()
+        for stream in self.streams:
+            if stream.cap is not None:
+                stream.cap.release()
+        self.join(timeout=5.0)
+
+    def stats(self):
+        streams = {stream.name: stream.stats() for stream in self.streams}
+        elapsed = time.perf_counter() - self._started if self._started else 0.0
+        frames = sum(stats['frames'] for stats in streams.values())
+        return {
+            'elapsed_s': elapsed,
+            'frames': frames,
+            'fps': frames / elapsed if elapsed else 0.0,
+            'recent_fps': sum(stats['recent_fps'] for stats in streams.values() if stats['running']),
+            'streams': streams,
+        }
+
+    def _run_stream(self, stream):
+        metrics = get_metrics()
+        decider = stream.decider
+        try:
+            while not self._stopped.is_set():
+                ret, frame = stream.cap.read()
+                if not ret:
+                    break
+                recognizer = self.registry.get_recognizer()
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                with metrics.stage('multi_stream.detect'):
+                    faces = stream.tracker.detect(gray)
+
+                for (x, y, w, h) in faces:
+                    with metrics.stage('multi_stream.predict'):
+                        face_id, confidence = recognizer.predict(normalize_face(gray[y:y+h, x:x+w]))
+                    decision = decider.observe((x, y, w, h), face_id, confidence)
+                    if decision.state in (ACCEPT, REJECT) and decision.track_id not in stream.reported:
+                        stream.reported.add(decision.track_id)
+                        self._report(stream, decision)
+                decider.end_frame()
+
+                # Tracks that left the frame are not needed again; keep memory flat on long runs.
+                decider.finished_tracks.clear()
+                stream.reported &= {track.track_id for track in decider.tracks}
+
+                stream.frames += 1
+                stream.faces += len(faces)
+                stream.frame_times.append(time.perf_counter())
+                metrics.count('multi_stream.frames')
+        except Exception as e:
+            print(f"[{stream.name}] Stream stopped: {e}")
+        finally:
+            stream.finished = time.perf_counter()
+
+    def _report(self, stream, decision):
+        user = None
+        if decision.state == ACCEPT:
+            stream.accepted += 1
+            if self.repository is not None:
+                user = self.repository.find_by_face_id(decision.label)
+        else:
+            stream.rejected += 1
+        if self.on_decision is None:
+            return
+        try:
+            self.on_decision(stream.name, decision, user)
+        except Exception as e:
+            print(f"[{stream.name}] Decision callback failed: {e}")
+
+
+if __name__ == '__main__':
+    import argparse
+    from app.model_registry import RECOGNIZER_ENGINES
+
+    parser = argparse.ArgumentParser(description="Run face recognition on several cameras or videos at once")
+    parser.add_argument('sources', nargs='+', help="Camera indexes, video files or image folders")
+    parser.add_argument('--engine', choices=RECOGNIZER_ENGINES, default='cv2')
+    parser.add_argument('--storage', choices=['json', 'sqlite'], default='json', help="User store for face ids")
+    parser.add_argument('--duration', type=float, default=None, help="Stop after this many seconds")
+    parser.add_argument('--report-every', type=float, default=5.0, help="Seconds between fps reports")
+    parser.add_argument('--no-realtime', action='store_true', help="Read video files as fast as possible")
+    parser.add_argument('--no-tracking', action='store_true')
+    args = parser.parse_args()
+
+    if args.storage == 'sqlite':
+        from app.sqlite_repository import SQLiteUserRepository
+        repository = SQLiteUserRepository()
+    else:
+        from app.repository import UserRepository
+        repository = UserRepository()
+    get_model_registry().set_engine(args.engine)
+
+    runner = MultiStreamRunner(args.sources, repository, tracking=not args.no_tracking, realtime=not args.no_realtime)
+    if runner.start():
+        started = time.perf_counter()
+        try:
+            while not runner.join(timeout=args.report_every):
+                stats = runner.stats()
+                print(f"{stats['recent_fps']:.1f} fps total | " +
+                      " | ".join(f"{name}: {s['recent_fps']:.1f} fps" if s['running'] else f"{name}: done"
+                                 for name, s in stats['streams'].items()))
+                if args.duration and time.perf_counter() - started >= args.duration:
+                    break
+        except KeyboardInterrupt:
+            pass
+        runner.stop()
+        stats = runner.stats()
+        print(f"{stats['frames']} frames in {stats['elapsed_s']:.1f} s ({stats['fps']:.1f} fps total)")
+        for name, s in stats['streams'].items():
+            print(f"  {name}: {s['frames']} frames, {s['fps']:.1f} fps, {s['faces']} faces, "
+                  f"{s['accepted']} accepted, {s['rejected']} rejected")
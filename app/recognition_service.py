@@ -0,0 +1,390 @@
+import asyncio
+import cv2
+import http.client
+import json
+import threading
+import time
+import urllib.parse
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from app.detection import MIN_FACE_SIZE, FaceDetector
+from app.model_registry import MODEL_PATH, get_model_registry
+from app.sample_store import normalize_face
+
+SERVICE_HOST = '127.0.0.1'
+SERVICE_PORT = 8765
+SERVICE_URL = f'http://{SERVICE_HOST}:{SERVICE_PORT}'
+SERVICE_WORKERS = 4
+# Faces waiting for a free worker are predicted together, up to MAX_BATCH at a time;
+# BATCH_WAIT_MS is how long a lone face waits for company before it is predicted alone.
+MAX_BATCH = 32
+BATCH_WAIT_MS = 2
+# Requests processed at once; up to MAX_QUEUED more wait, anything beyond gets 503.
+MAX_CONCURRENCY = 16
+MAX_QUEUED = 64
+MAX_BODY_BYTES = 8 * 1024 * 1024
+KEEPALIVE_TIMEOUT = 30
+# A face_id missing from the user index triggers a reload at most this often.
+USERNAME_RELOAD_S = 10
+CLIENT_TIMEOUT = 5.0
+
+
+class RecognitionServiceError(Exception):
+    pass
+
+
+class _HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+            500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class UsernameIndex:
+    """face_id -> username from the user store, reloaded when an unknown id shows up."""
+
+    def __init__(self, storage='json'):
+        self.storage = storage
+        self._lock = threading.Lock()
+        self._names = {}
+        self._loaded_at = None
+
+    def get(self, face_id):
+        name = self._names.get(face_id)
+        if name is None and self.storage != 'none':
+            with self._lock:
+                if self._loaded_at is None or time.monotonic() - self._loaded_at >= USERNAME_RELOAD_S:
+                    self.reload()
+            name = self._names.get(face_id)
+        return name or ''
+
+    def reload(self):
+        from app.batch_identify import load_usernames
+
+        self._loaded_at = time.monotonic()
+        try:
+            self._names = load_usernames(self.storage)
+        except Exception as e:
+            print(f"Error loading users: {e}")
+
+
+class RecognitionService:
+    """Headless HTTP front end to one shared face model.
+
+    POST /identify takes an encoded image (JPEG, PNG, ...) and returns every
+    face found in it; with ?crop=1 the image is taken to be a face crop and
+    detection is skipped. GET /health and GET /stats report the model and
+    service counters. Decoding and detection run on a thread pool, and the
+    faces of all in-flight requests are queued to a batcher that predicts
+    them together, so a busy service calls predict_batch() with many faces
+    at once. The model comes from the model registry and is reloaded when
+    trainer.yml changes.
+    """
+
+    def __init__(self, registry=None, usernames=None, workers=SERVICE_WORKERS, max_batch=MAX_BATCH,
+                 batch_wait_ms=BATCH_WAIT_MS, max_concurrency=MAX_CONCURRENCY, max_queued=MAX_QUEUED,
+                 min_face=MIN_FACE_SIZE):
+        self.registry = registry or get_model_registry()
+        self.usernames = usernames or UsernameIndex('none')
+        self.workers = workers
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait_ms / 1000.0
+        self.max_concurrency = max_concurrency
+        self.max_queued = max_queued
+        self.min_face = min_face
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='recognition')
+        self._local = threading.local()
+        self._queue = None
+        self._slots = None
+        self._batch_slots = None
+        self._active = 0
+        self.counters = {'requests': 0, 'faces': 0, 'batches': 0, 'busy_rejections': 0, 'errors': 0}
+
+    async def serve(self, host=SERVICE_HOST, port=SERVICE_PORT, ready=None):
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._batch_slots = asyncio.Semaphore(self.workers)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self._load_model)
+        batcher = asyncio.create_task(self._run_batches())
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        address = server.sockets[0].getsockname()
+        print(f"Recognition service listening on http://{address[0]}:{address[1]}")
+        if ready is not None:
+            ready(address)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            self.executor.shutdown(wait=False)
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats['active'] = self._active
+        stats['queued_faces'] = self._queue.qsize() if self._queue is not None else 0
+        stats['mean_batch'] = stats['faces'] / stats['batches'] if stats['batches'] else 0.0
+        return stats
+
+    def _health(self):
+        # Runs on a worker: get_recognizer() re-reads trainer.yml after it changed.
+        recognizer = self.registry.get_recognizer()
+        if recognizer is None:
+            return 503, {'status': 'no_model', 'engine': self.registry.engine, 'samples': None}
+        samples = len(recognizer.labels) if hasattr(recognizer, 'labels') else len(recognizer.getLabels())
+        return 200, {'status': 'ok', 'engine': self.registry.engine, 'samples': samples}
+
+    def _load_model(self):
+        self.registry.get_cascade()
+        if self.registry.get_recognizer() is None:
+            print("Trainer File Not Found! Requests are answered with 503 until the model exists.")
+
+    # HTTP
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), KEEPALIVE_TIMEOUT)
+                except _HTTPError as e:
+                    self._write_response(writer, e.status, {'error': str(e)}, keep_alive=False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, path, query, headers, body = request
+                status, payload = await self._dispatch(method, path, query, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, _ = line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            raise _HTTPError(400, "Malformed request line")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+            if len(headers) > 100:
+                raise _HTTPError(400, "Too many headers")
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise _HTTPError(400, "Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise _HTTPError(413, f"Body larger than {MAX_BODY_BYTES} bytes")
+        body = await reader.readexactly(length) if length else b''
+        url = urllib.parse.urlsplit(target)
+        return method.upper(), url.path, urllib.parse.parse_qs(url.query), headers, body
+
+    def _write_response(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode()
+        head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + body)
+
+    async def _dispatch(self, method, path, query, body):
+        if path == '/health':
+            return await asyncio.get_running_loop().run_in_executor(self.executor, self._health)
+        if path == '/stats':
+            return 200, self.stats()
+        if path != '/identify':
+            return 404, {'error': f"Unknown path: {path}"}
+        if method != 'POST':
+            return 405, {'error': "Use POST with an encoded image as the body"}
+
+        if self._active >= self.max_concurrency + self.max_queued:
+            self.counters['busy_rejections'] += 1
+            return 503, {'error': "Service busy"}
+        self._active += 1
+        try:
+            async with self._slots:
+                self.counters['requests'] += 1
+                crop = query.get('crop', ['0'])[0] in ('1', 'true', 'yes')
+                return await self._identify(body, crop)
+        except RecognitionServiceError as e:
+            return 503, {'error': str(e)}
+        except Exception as e:
+            self.counters['errors'] += 1
+            print(f"Recognition error: {e}")
+            return 500, {'error': str(e)}
+        finally:
+            self._active -= 1
+
+    # Recognition
+
+    async def _identify(self, body, crop):
+        loop = asyncio.get_running_loop()
+        boxes, faces = await loop.run_in_executor(self.executor, self._detect, body, crop)
+        if boxes is None:
+            return 400, {'error': "Body is not a decodable image"}
+        futures = []
+        for face in faces:
+            future = loop.create_future()
+            self._queue.put_nowait((face, future))
+            futures.append(future)
+        predictions = await asyncio.gather(*futures)
+        results = []
+        for (x, y, w, h), (face_id, confidence, username) in zip(boxes, predictions):
+            results.append({'box': [int(x), int(y), int(w), int(h)], 'face_id': face_id,
+                            'username': username, 'confidence': round(confidence, 3)})
+        return 200, {'faces': results}
+
+    def _detect(self, body, crop):
+        image = cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_GRAYSCALE) if body else None
+        if image is None:
+            return None, None
+        if crop:
+            return [(0, 0, image.shape[1], image.shape[0])], [normalize_face(image)]
+        detector = getattr(self._local, 'detector', None)
+        if detector is None:
+            # CascadeClassifier is not safe to share between threads, so each worker gets its own.
+            detector = self._local.detector = FaceDetector(min_face=self.min_face)
+        boxes = detector.detect(image)
+        return boxes, [normalize_face(image[y:y + h, x:x + w]) for (x, y, w, h) in boxes]
+
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._batch_slots.acquire()
+            batch = [await self._queue.get()]
+            if self.batch_wait and self._queue.qsize() < self.max_batch - 1:
+                await asyncio.sleep(self.batch_wait)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            task = loop.run_in_executor(self.executor, self._predict, [face for face, _ in batch])
+            task.add_done_callback(lambda done, batch=batch: self._finish_batch(done, batch))
+
+    def _finish_batch(self, done, batch):
+        self._batch_slots.release()
+        self.counters['batches'] += 1
+        self.counters['faces'] += len(batch)
+        error = done.exception()
+        for i, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(done.result()[i])
+
+    def _predict(self, faces):
+        recognizer = self.registry.get_recognizer()
+        if recognizer is None:
+            raise RecognitionServiceError("Face model not loaded")
+        if hasattr(recognizer, 'predict_batch'):
+            predictions = zip(*recognizer.predict_batch(faces))
+        else:
+            predictions = map(recognizer.predict, faces)
+        # Usernames are resolved here on the worker, since an unknown face_id reloads the user store.
+        return [(int(label), float(confidence), self.usernames.get(int(label))) for label, confidence in predictions]
+
+
+class RecognitionClient:
+    """Sends face crops to a RecognitionService over a kept-alive connection.
+
+    predict() has the same signature as the LBPH recognizers, so face login
+    can use the client in place of a local model.
+    """
+
+    def __init__(self, url=SERVICE_URL, timeout=CLIENT_TIMEOUT):
+        parsed = urllib.parse.urlsplit(url if '//' in url else '//' + url)
+        self.host = parsed.hostname or SERVICE_HOST
+        self.port = parsed.port or SERVICE_PORT
+        self.timeout = timeout
+        self._connection = None
+
+    def predict(self, face):
+        ok, encoded = cv2.imencode('.png', face, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        if not ok:
+            raise RecognitionServiceError("Could not encode face crop")
+        faces = self._request('POST', '/identify?crop=1', encoded.tobytes())['faces']
+        return faces[0]['face_id'], faces[0]['confidence']
+
+    def identify(self, frame, quality=90):
+        """Detect and identify every face in a BGR or grayscale frame. Returns the service's face dicts."""
+        ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise RecognitionServiceError("Could not encode frame")
+        return self._request('POST', '/identify', encoded.tobytes())['faces']
+
+    def health(self):
+        return self._request('GET', '/health')
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _request(self, method, path, body=None):
+        headers = {'Content-Type': 'application/octet-stream'} if body is not None else {}
+        for attempt in range(2):
+            if self._connection is None:
+                self._connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self._connection.request(method, path, body, headers)
+                response = self._connection.getresponse()
+                payload = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                self.close()
+                # A kept-alive connection the server already closed fails once; retry on a fresh one.
+                if attempt:
+                    raise RecognitionServiceError(f"Recognition service unreachable at {self.host}:{self.port}: {e}")
+                continue
+            try:
+                data = json.loads(payload)
+            except ValueError:
+                data = {}
+            if response.status != 200:
+                raise RecognitionServiceError(f"Recognition service error {response.status}: "
+                                              f"{data.get('error', response.reason)}")
+            return data
+
+
+if __name__ == '__main__':
+    import argparse
+    from app.model_registry import RECOGNIZER_ENGINES, ModelRegistry
+
+    parser = argparse.ArgumentParser(description="Serve face identification for several kiosks from one loaded model")
+    parser.add_argument('--host', default=SERVICE_HOST, help="Use 0.0.0.0 to accept other machines")
+    parser.add_argument('--port', type=int, default=SERVICE_PORT)
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--engine', choices=RECOGNIZER_ENGINES, default='numpy',
+                        help="numpy and ivf predict a whole batch in one call")
+    parser.add_argument('--storage', choices=['json', 'sqlite', 'none'], default='json',
+                        help="User store used to resolve usernames")
+    parser.add_argument('--workers', type=int, default=SERVICE_WORKERS, help="Threads for decoding, detection and prediction")
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    parser.add_argument('--batch-wait-ms', type=float, default=BATCH_WAIT_MS)
+    parser.add_argument('--max-concurrency', type=int, default=MAX_CONCURRENCY)
+    parser.add_argument('--max-queued', type=int, default=MAX_QUEUED)
+    parser.add_argument('--min-face', type=int, default=MIN_FACE_SIZE)
+    args = parser.parse_args()
+
+    service = RecognitionService(ModelRegistry(args.model, args.engine), UsernameIndex(args.storage), args.workers,
+                                 args.max_batch, args.batch_wait_ms, args.max_concurrency, args.max_queued,
+                                 args.min_face)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
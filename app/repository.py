@@ -1,12 +1,12 @@
-import json
 import os
 import bcrypt
 from cryptography.fernet import Fernet, InvalidToken
 from datetime import datetime
 import random
 import string
-import cv2
 import glob
+import threading
+from app.user_journal import UserJournal
 
 class User:
     def __init__(self, username, password, mail, face_id=None):
@@ -18,15 +18,52 @@ class User:
         self.reset_code_expiry = None
         self.face_id = face_id
 
+    @classmethod
+    def from_record(cls, record):
+        user = cls(username=record['username'], password=record['password'], mail=record['mail'], face_id=record.get("face_id"))
+        if record.get("registration_date"):
+            user.registration_date = record["registration_date"]
+        return user
+
+# bcrypt work factor for new hashes. Stored hashes with a different cost are
+# rehashed transparently at the next successful login.
+BCRYPT_ROUNDS = 12
+
 class UserRepository:
-    def __init__(self):
+    def __init__(self, bcrypt_rounds=BCRYPT_ROUNDS):
+        self.bcrypt_rounds = bcrypt_rounds
+        self.lock = threading.RLock()
         self.users = []
+        self.users_by_username = {}
+        self.users_by_mail = {}
+        self.users_by_face_id = {}
         self.isLoggedIn = False
         self.currentUser = {}
+        self.capture_stats = None
+        self.scheduler_stats = None
+        self.decision_trace = []
+        # URL of a shared recognition service (app/recognition_service.py) used by face_login instead of a local model.
+        self.recognition_service = None
 
         self.loadUsers()
 
     def loadUsers(self):
+        key = self.ensure_key()
+
+        self.journal = UserJournal(Fernet(key), "data")
+        try:
+            for record in self.journal.load():
+                self.users.append(User.from_record(record))
+        except InvalidToken:
+            print("Invalid token error")
+            self.users = [] 
+            self.save_to_file() 
+        except Exception as e:
+            print(f"Error loading users: {e}")
+
+        self.rebuild_indexes()
+
+    def ensure_key(self):
         if os.path.exists("secret.key") and not os.path.exists(os.path.join("secrets", "secret.key")):
             if not os.path.exists("secrets"):
                 os.makedirs("secrets")
@@ -41,90 +78,184 @@ class UserRepository:
             self.save_key(key)
         else:
             key = self.load_key()
+        return key
+
+    def rebuild_indexes(self):
+        self.users_by_username = {}
+        self.users_by_mail = {}
+        self.users_by_face_id = {}
+        for user in self.users:
+            self.index_user(user)
+
+    def index_user(self, user):
+        # setdefault keeps the earliest registered user, as the old linear scans did.
+        self.users_by_username.setdefault(user.username, user)
+        self.users_by_mail.setdefault(user.mail, user)
+        if user.face_id is not None:
+            self.users_by_face_id.setdefault(user.face_id, user)
+
+    def find_by_username(self, username):
+        return self.users_by_username.get(username)
 
-        if os.path.exists(os.path.join("data", "users.json")):
-            try:
-                with open(os.path.join("data", "users.json"), 'r') as file: 
-                    data = file.read()
-                    if data:
-                        try:
-                            fernet = Fernet(key)
-                            decrypted_data = fernet.decrypt(data.encode()).decode()
-                            users = json.loads(decrypted_data)
-                            for user_data in users:
-                                user = json.loads(user_data)
-                                newUser = User(username=user['username'], password=user['password'], mail=user['mail'], face_id=user.get("face_id"))
-                                self.users.append(newUser)
-                        except InvalidToken:
-                            print("Invalid token error")
-                            self.users = [] 
-                            self.save_to_file() 
-            except Exception as e:
-                print(f"Error loading users: {e}")
+    def find_by_mail(self, email):
+        return self.users_by_mail.get(email)
+
+    def find_by_face_id(self, face_id):
+        return self.users_by_face_id.get(face_id)
+
+    def set_face_id(self, user, face_id):
+        if user.face_id is not None and self.users_by_face_id.get(user.face_id) is user:
+            del self.users_by_face_id[user.face_id]
+        user.face_id = face_id
+        if face_id is not None:
+            self.users_by_face_id.setdefault(face_id, user)
     
     def send_email_verification_code(self, email):
         code = ''.join(random.choices(string.digits, k=6))
         print(f"[DEBUG] {email} Verification code: {code}")  
         return code
 
-    def face_login(self):
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        recognizer = cv2.face.LBPHFaceRecognizer_create()
-        try:
-            recognizer.read(os.path.join("data", "trainer.yml"))
-        except:
+    def face_login(self, source=0, show=True, threaded=True, tracking=True, decider=None, engine=None, service=None,
+                   scheduler=None):
+        # OpenCV and the face modules are imported here so that starting the
+        # app does not pay for them until a face operation actually runs.
+        import cv2
+        from app.decision import ACCEPT, REJECT, VotingDecider
+        from app.detection import FaceDetector, FaceTracker
+        from app.frame_scheduler import create_scheduler
+        from app.frame_source import FrameSource, ThreadedFrameSource, open_frame_source
+        from app.metrics import get_metrics
+        from app.model_registry import get_model_registry
+        from app.sample_store import normalize_face
+
+        metrics = get_metrics()
+        registry = get_model_registry()
+        if engine is not None:
+            registry.set_engine(engine)
+        face_cascade = registry.get_cascade()
+        service = service or self.recognition_service
+        if service:
+            from app.recognition_service import RecognitionClient, RecognitionServiceError
+            recognizer = RecognitionClient(service) if isinstance(service, str) else service
+            prediction_errors = (RecognitionServiceError,)
+        else:
+            recognizer = registry.get_recognizer()
+            prediction_errors = ()
+        if recognizer is None:
             print("Trainer File Not Found!")
             return None
-        cap = cv2.VideoCapture(0)
+        owns_source = not isinstance(source, FrameSource)
+        # A threaded reader keeps only the newest frame, so files and folders are replayed at their own frame rate.
+        cap = open_frame_source(source, realtime=threaded)
+        if threaded:
+            cap = ThreadedFrameSource(cap, release_source=owns_source)
+        tracker = FaceTracker(FaceDetector(face_cascade), redetect_every=10 if tracking else 0)
+        if decider is None:
+            decider = VotingDecider()
+        if scheduler is None:
+            scheduler = create_scheduler()
+        scheduler.attach(tracker.detector)
+        shown_faces = []
         authenticated_user = None
         unknown_detected = False
+        rejected = False
+        service_failed = False
         
         failed_attempts = 0
         max_attempts = 50
 
         while True:
-            ret, frame = cap.read()
+            with metrics.stage('face_login.read'):
+                ret, frame = cap.read()
             if not ret:
                 break
+            metrics.count('face_login.frames')
+            scheduler.begin_frame()
 
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+            # Frames the scheduler skips only show the last boxes; detection and recognition wait for the next one.
+            detect = scheduler.should_detect()
+            faces = []
+            if detect:
+                with metrics.stage('face_login.convert'):
+                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                with metrics.stage('face_login.detect'):
+                    faces = shown_faces = scheduler.limit_faces(tracker.detect(gray))
+                metrics.count('face_login.faces', len(faces))
+            for (x, y, w, h) in shown_faces:
+                cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
 
             for (x, y, w, h) in faces:
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
                 
-                roi_gray = gray[y:y+h, x:x+w]
-                predicted_id, confidence = recognizer.predict(roi_gray)
+                try:
+                    with metrics.stage('face_login.predict'):
+                        roi_gray = normalize_face(gray[y:y+h, x:x+w])
+                        predicted_id, confidence = recognizer.predict(roi_gray)
+                except prediction_errors as e:
+                    print(f"Face recognition failed: {e}")
+                    service_failed = True
+                    break
+                metrics.count('face_login.predictions')
 
                 print(f"Predicted ID: {predicted_id}, Confidence: {confidence}")
+                decision = decider.observe((x, y, w, h), predicted_id, confidence)
                 
-                if confidence < 50:
-                    matched_user = next((user for user in self.users if user.face_id == predicted_id), None)
+                if decision.state == ACCEPT:
+                    with metrics.stage('face_login.lookup'):
+                        matched_user = self.find_by_face_id(decision.label)
                     if matched_user:
                         self.currentUser = matched_user
                         self.isLoggedIn = True
                         authenticated_user = matched_user
+                        metrics.count('face_login.accepted')
                         break
                     else:
                         print("ID recognized but user not found.")
+                        decider.reset_track(decision.track_id)
                         unknown_detected = True
                         failed_attempts += 1
-                else:
+                        metrics.count('face_login.failed_attempts')
+                elif decision.state == REJECT:
+                    print("Face rejected as unknown.")
+                    unknown_detected = True
+                    rejected = True
+                    metrics.count('face_login.rejected')
+                    break
+                elif confidence >= decider.accept_confidence:
                     print("Face not recognized, confidence value low.")
                     unknown_detected = True
                     failed_attempts += 1
+                    metrics.count('face_login.failed_attempts')
+            if detect:
+                decider.end_frame()
             
-            cv2.imshow('Face Recognition', frame)
+            key = None
+            if show:
+                with metrics.stage('face_login.display'):
+                    cv2.imshow('Face Recognition', frame)
+                    key = cv2.waitKey(1) & 0xFF
+            scheduler.end_frame()
             
             if failed_attempts >= max_attempts:
                 print(f"Maximum recognition attempts ({max_attempts}) reached.")
                 break
 
-            if authenticated_user or cv2.waitKey(1) & 0xFF == ord('q'):
+            if authenticated_user or rejected or service_failed or key == ord('q'):
                 break
 
-        cap.release()
-        cv2.destroyAllWindows()
+        if threaded:
+            cap.release()
+            self.capture_stats = cap.stats()
+            print(f"Capture stats: {self.capture_stats}")
+        elif owns_source:
+            cap.release()
+        if show:
+            cv2.destroyAllWindows()
+        self.scheduler_stats = scheduler.stats()
+        if scheduler.target_fps:
+            print(f"Scheduler stats: {self.scheduler_stats}")
+        if isinstance(service, str):
+            recognizer.close()
+        self.decision_trace = decider.trace()
 
         if failed_attempts >= max_attempts:
             return "max_attempts"
@@ -135,19 +266,22 @@ class UserRepository:
         return authenticated_user
 
     def save_to_file(self):
-        list = []
-        for user in self.users:
-            list.append(json.dumps(user.__dict__))
+        with self.lock:
+            self.journal.compact([user.__dict__ for user in self.users])
 
-        encrypted_data = json.dumps(list)
-        key = self.load_key()
-        fernet = Fernet(key)
-        encrypted_data = fernet.encrypt(encrypted_data.encode()).decode()
+    def save_user(self, user):
+        with self.lock:
+            if self.journal.append(user.__dict__):
+                self.save_to_file()
 
-        with open(os.path.join("data", "users.json"), 'w') as file:
-            file.write(encrypted_data)
+    def hash_password(self, password):
+        return bcrypt.hashpw(password.encode(), bcrypt.gensalt(self.bcrypt_rounds)).decode()
 
-        self.save_key(key)
+    def needs_rehash(self, hashed_password):
+        try:
+            return int(hashed_password.split('$')[2]) != self.bcrypt_rounds
+        except (IndexError, ValueError):
+            return False
 
     def generate_key(self):
         return Fernet.generate_key()
@@ -162,25 +296,38 @@ class UserRepository:
         return open(os.path.join("secrets", "secret.key"), "rb").read()
 
     def register(self, user: User):
-        for existing_user in self.users:
-            if existing_user.username == user.username:
+        if self.find_by_username(user.username) is not None:
+            print("This username already exists!")
+            return False
+
+        user.password = self.hash_password(user.password)
+        with self.lock:
+            if self.find_by_username(user.username) is not None:
                 print("This username already exists!")
                 return False
-
-        hashed_password = bcrypt.hashpw(user.password.encode(), bcrypt.gensalt())
-        user.password = hashed_password.decode()
-        self.users.append(user)
-        self.save_to_file()
+            self.add_user(user)
         print('User registered successfully')
         return True
 
+    def add_user(self, user):
+        self.users.append(user)
+        self.index_user(user)
+        self.save_user(user)
+
+    def next_face_id(self, user):
+        return self.users.index(user) + 1
+
     def login(self, username, password):
-        for user in self.users:
-            if user.username == username and bcrypt.checkpw(password.encode(), user.password.encode()):
-                self.isLoggedIn = True
-                self.currentUser = user
-                print('Login successful')
-                break
+        user = self.find_by_username(username)
+        if user and bcrypt.checkpw(password.encode(), user.password.encode()):
+            if self.needs_rehash(user.password):
+                user.password = self.hash_password(password)
+                self.save_user(user)
+            self.isLoggedIn = True
+            self.currentUser = user
+            print('Login successful')
+            return user
+        return None
 
     def logout(self):
         self.isLoggedIn = False
@@ -198,34 +345,38 @@ class UserRepository:
         return ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
 
     def send_reset_code(self, email):
-        for user in self.users:
-            if user.mail == email:
-                user.reset_code = self.generate_reset_code()
-                user.reset_code_expiry = datetime.now().timestamp() + 300  
-                print(f"Reset code for {email}: {user.reset_code}") 
-                return True
+        user = self.find_by_mail(email)
+        if user:
+            user.reset_code = self.generate_reset_code()
+            user.reset_code_expiry = datetime.now().timestamp() + 300  
+            print(f"Reset code for {email}: {user.reset_code}") 
+            return True
         return False
 
     def verify_reset_code(self, email, code):
-        for user in self.users:
-            if user.mail == email and user.reset_code == code:
-                if datetime.now().timestamp() < user.reset_code_expiry:
-                    return True
+        user = self.find_by_mail(email)
+        if user and user.reset_code == code:
+            if datetime.now().timestamp() < user.reset_code_expiry:
+                return True
         return False
 
     def reset_password(self, email, new_password):
-        for user in self.users:
-            if user.mail == email:
-                hashed_password = bcrypt.hashpw(new_password.encode(), bcrypt.gensalt())
-                user.password = hashed_password.decode()
-                user.reset_code = None
-                user.reset_code_expiry = None
-                self.save_to_file()
-                return True
+        user = self.find_by_mail(email)
+        if user:
+            user.password = self.hash_password(new_password)
+            user.reset_code = None
+            user.reset_code_expiry = None
+            self.save_user(user)
+            return True
         return False
       
     def delete_face_data(self, face_id):
-        files = glob.glob(f"data/User.{face_id}.*.jpg")
-        for file in files:
+        from app.sample_store import FaceSampleStore
+
+        self.delete_legacy_face_images(face_id)
+        FaceSampleStore().delete(face_id)
+        print(f"Face data for Face ID {face_id} has been deleted.")
+
+    def delete_legacy_face_images(self, face_id):
+        for file in glob.glob(f"data/User.{face_id}.*.jpg"):
             os.remove(file)
-        print(f"Face data for Face ID {face_id} has been deleted.")
\ No newline at end of file
@@ -0,0 +1,151 @@
+import cv2
+import json
+import os
+import numpy as np
+
+STORE_DIR = os.path.join('data', 'samples')
+INDEX_FILE = 'index.json'
+SAMPLE_SIZE = (100, 100)
+
+
+def normalize_face(face):
+    if face.ndim == 3:
+        face = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
+    if face.shape[:2] != (SAMPLE_SIZE[1], SAMPLE_SIZE[0]):
+        face = cv2.resize(face, SAMPLE_SIZE, interpolation=cv2.INTER_AREA)
+    return np.ascontiguousarray(face, dtype=np.uint8)
+
+
+class FaceSampleStore:
+    """Normalized grayscale face crops, one fixed-shape .npy array per user."""
+
+    def __init__(self, path=STORE_DIR):
+        self.path = path
+        self.index = {}
+        self.load_index()
+
+    def load_index(self):
+        index_path = os.path.join(self.path, INDEX_FILE)
+        if not os.path.exists(index_path):
+            self.index = {}
+            return
+        try:
+            with open(index_path, 'r') as file:
+                self.index = {int(face_id): entry for face_id, entry in json.load(file).items()}
+        except (ValueError, OSError) as e:
+            print(f"Error loading sample index: {e}")
+            self.index = {}
+
+    def save_index(self):
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        index_path = os.path.join(self.path, INDEX_FILE)
+        tmp_path = index_path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump({str(face_id): entry for face_id, entry in self.index.items()}, file)
+        os.replace(tmp_path, index_path)
+
+    def face_ids(self):
+        return sorted(self.index)
+
+    def count(self, face_id=None):
+        if face_id is None:
+            return sum(entry['count'] for entry in self.index.values())
+        entry = self.index.get(face_id)
+        return entry['count'] if entry else 0
+
+    def get_samples(self, face_id):
+        entry = self.index.get(face_id)
+        if not entry:
+            return np.empty((0, SAMPLE_SIZE[1], SAMPLE_SIZE[0]), dtype=np.uint8)
+        return np.load(os.path.join(self.path, entry['file']), mmap_mode='r')
+
+    def iter_samples(self):
+        for face_id in self.face_ids():
+            yield face_id, self.get_samples(face_id)
+
+    def replace_samples(self, face_id, faces):
+        self._write(face_id, [normalize_face(face) for face in faces])
+
+    def add_samples(self, face_id, faces):
+        samples = list(self.get_samples(face_id))
+        samples.extend(normalize_face(face) for face in faces)
+        self._write(face_id, samples)
+
+    def delete(self, face_id):
+        entry = self.index.pop(face_id, None)
+        if entry is None:
+            return False
+        sample_path = os.path.join(self.path, entry['file'])
+        if os.path.exists(sample_path):
+            os.remove(sample_path)
+        self.save_index()
+        return True
+
+    def _write(self, face_id, samples):
+        if not samples:
+            self.delete(face_id)
+            return
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+
+        file_name = f'user_{face_id}.npy'
+        sample_path = os.path.join(self.path, file_name)
+        tmp_path = os.path.join(self.path, f'user_{face_id}.tmp.npy')
+        np.save(tmp_path, np.stack(samples))
+        os.replace(tmp_path, sample_path)
+
+        self.index[face_id] = {'file': file_name, 'count': len(samples)}
+        self.save_index()
+
+
+def migrate_jpeg_samples(path='data', store=None, remove=True, workers=None, chunk_size=64):
+    """Move legacy data/User.{face_id}.{n}.jpg crops into the packed store.
+
+    With remove, only the JPEGs that produced a stored sample are deleted;
+    files in which no face is found again are kept and counted as skipped.
+    """
+    from app.trainer import _iter_processed, list_image_paths
+
+    store = store or FaceSampleStore(os.path.join(path, 'samples'))
+    image_paths = list_image_paths(path)
+
+    by_user = {}
+    migrated_paths = []
+    for image_path, results in zip(image_paths, _iter_processed(image_paths, None, workers, chunk_size)):
+        if not results:
+            continue
+        migrated_paths.append(image_path)
+        for face, face_id, _ in results:
+            by_user.setdefault(face_id, []).append(face)
+    for face_id, user_faces in by_user.items():
+        store.add_samples(face_id, user_faces)
+
+    if remove:
+        for image_path in migrated_paths:
+            os.remove(image_path)
+
+    samples = sum(len(user_faces) for user_faces in by_user.values())
+    skipped = len(image_paths) - len(migrated_paths)
+    print(f"Migrated {samples} samples for {len(by_user)} users.")
+    if skipped:
+        print(f"{skipped} images had no detectable face and were left in {path}.")
+    return samples
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Face sample store maintenance")
+    parser.add_argument('command', choices=['migrate', 'stats'])
+    parser.add_argument('--data', default='data')
+    parser.add_argument('--keep-jpeg', action='store_true', help="Keep the legacy JPEG files after migrating")
+    parser.add_argument('--workers', type=int, default=None, help="Decode/detect processes (default: all cores)")
+    parser.add_argument('--chunk-size', type=int, default=64)
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        migrate_jpeg_samples(args.data, remove=not args.keep_jpeg, workers=args.workers, chunk_size=args.chunk_size)
+    else:
+        store = FaceSampleStore(os.path.join(args.data, 'samples'))
+        print(f"{len(store.face_ids())} users, {store.count()} samples")
@@ -0,0 +1,168 @@
+import hashlib
+import hmac
+import json
+import os
+import sqlite3
+from cryptography.fernet import Fernet
+from app.repository import BCRYPT_ROUNDS, User, UserRepository
+from app.user_journal import UserJournal
+
+DB_PATH = os.path.join('data', 'users.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username_hash BLOB NOT NULL UNIQUE,
+    mail_hash BLOB NOT NULL,
+    face_id INTEGER,
+    record BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_mail_hash ON users (mail_hash);
+CREATE INDEX IF NOT EXISTS users_face_id ON users (face_id);
+"""
+
+
+class SQLiteUserRepository(UserRepository):
+    """UserRepository backed by SQLite instead of the encrypted journal.
+
+    Each row holds the whole user record encrypted with the Fernet key.
+    Username and mail are looked up through keyed HMAC digests ("blind
+    indexes"), so the database never stores them in clear. Nothing is
+    loaded at startup. Users are read on first lookup and cached by
+    username, so in-memory state such as a pending reset code survives
+    between calls. self.users stays empty with this backend.
+    """
+
+    def __init__(self, db_path=DB_PATH, bcrypt_rounds=BCRYPT_ROUNDS):
+        self.db_path = db_path
+        super().__init__(bcrypt_rounds)
+
+    def loadUsers(self):
+        key = self.ensure_key()
+        self.fernet = Fernet(key)
+        self.index_key = hmac.new(key, b'user-index', hashlib.sha256).digest()
+        self.cache = {}
+
+        if not os.path.exists(os.path.dirname(self.db_path) or '.'):
+            os.makedirs(os.path.dirname(self.db_path))
+        self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def blind_index(self, value):
+        return hmac.new(self.index_key, value.encode(), hashlib.sha256).digest()
+
+    def rebuild_indexes(self):
+        pass
+
+    def index_user(self, user):
+        self.cache[user.username] = user
+
+    def find_by_username(self, username):
+        with self.lock:
+            if username in self.cache:
+                return self.cache[username]
+            row = self.connection.execute(
+                "SELECT record FROM users WHERE username_hash = ?", (self.blind_index(username),)).fetchone()
+            return self._materialize(row)
+
+    def find_by_mail(self, email):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT record FROM users WHERE mail_hash = ? ORDER BY id LIMIT 1", (self.blind_index(email),)).fetchone()
+            return self._materialize(row)
+
+    def find_by_face_id(self, face_id):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT record FROM users WHERE face_id = ? ORDER BY id LIMIT 1", (face_id,)).fetchone()
+            return self._materialize(row)
+
+    def set_face_id(self, user, face_id):
+        user.face_id = face_id
+
+    def add_user(self, user):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT INTO users (username_hash, mail_hash, face_id, record) VALUES (?, ?, ?, ?)",
+                self._row(user))
+            self.cache[user.username] = user
+
+    def next_face_id(self, user):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT id FROM users WHERE username_hash = ?", (self.blind_index(user.username),)).fetchone()
+        return row[0]
+
+    def save_user(self, user):
+        username_hash, mail_hash, face_id, record = self._row(user)
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE users SET mail_hash = ?, face_id = ?, record = ? WHERE username_hash = ?",
+                (mail_hash, face_id, record, username_hash))
+
+    def save_to_file(self):
+        # Every change is already committed row by row.
+        pass
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def _row(self, user):
+        record = self.fernet.encrypt(json.dumps(user.__dict__).encode())
+        return self.blind_index(user.username), self.blind_index(user.mail), user.face_id, record
+
+    def _materialize(self, row):
+        if row is None:
+            return None
+        record = json.loads(self.fernet.decrypt(row[0]))
+        user = self.cache.get(record['username'])
+        if user is None:
+            user = User.from_record(record)
+            user.reset_code = record.get('reset_code')
+            user.reset_code_expiry = record.get('reset_code_expiry')
+            self.cache[user.username] = user
+        return user
+
+
+def import_users(data_dir='data', db_path=DB_PATH):
+    """Copy users from users.json (or its snapshot and journal) into the SQLite database.
+
+    Row ids follow the original registration order, so they match the
+    face_ids the JSON backend assigned.
+    """
+    repository = SQLiteUserRepository(db_path)
+    # Read only: a legacy users.json stays in place for the JSON backend.
+    records = UserJournal(repository.fernet, data_dir).load(migrate=False)
+
+    imported = 0
+    with repository.lock, repository.connection:
+        for position, record in enumerate(records, start=1):
+            user = User.from_record(record)
+            username_hash, mail_hash, face_id, encrypted = repository._row(user)
+            if repository.connection.execute(
+                    "SELECT 1 FROM users WHERE username_hash = ?", (username_hash,)).fetchone():
+                continue
+            if repository.connection.execute("SELECT 1 FROM users WHERE id = ?", (position,)).fetchone():
+                position = None
+            repository.connection.execute(
+                "INSERT INTO users (id, username_hash, mail_hash, face_id, record) VALUES (?, ?, ?, ?, ?)",
+                (position, username_hash, mail_hash, face_id, encrypted))
+            imported += 1
+    repository.close()
+    print(f"Imported {imported} of {len(records)} users into {db_path}.")
+    return imported
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="SQLite user store maintenance")
+    parser.add_argument('command', choices=['import'])
+    parser.add_argument('--data', default='data')
+    parser.add_argument('--db', default=DB_PATH)
+    args = parser.parse_args()
+
+    import_users(args.data, args.db)
@@ -0,0 +1,253 @@
+import cv2
+import hashlib
+import json
+import multiprocessing
+import os
+import numpy as np
+from app.detection import FaceDetector
+from app.metrics import get_metrics
+from app.model_format import refresh_binary_model
+from app.model_registry import get_model_registry
+from app.sample_store import FaceSampleStore
+
+DATA_DIR = 'data'
+MODEL_FILE = 'trainer.yml'
+MANIFEST_FILE = 'trainer_manifest.json'
+
+# None uses every core; 1 keeps decoding and detection in the calling process.
+TRAIN_WORKERS = None
+TRAIN_CHUNK_SIZE = 64
+
+
+def load_manifest(path=DATA_DIR):
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, 'r') as file:
+            return {int(face_id): set(keys) for face_id, keys in json.load(file).items()}
+    except (ValueError, OSError) as e:
+        print(f"Error loading training manifest: {e}")
+        return None
+
+
+def save_manifest(manifest, path=DATA_DIR):
+    data = {str(face_id): sorted(keys) for face_id, keys in manifest.items()}
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    with open(manifest_path + '.tmp', 'w') as file:
+        json.dump(data, file)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+
+def _process_image(image_path, detector):
+    with open(image_path, 'rb') as file:
+        data = file.read()
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return []
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    faces = detector.detect(gray)
+
+    key = hashlib.sha1(data).hexdigest()
+    id = int(os.path.split(image_path)[-1].split('.')[1])
+    return [(gray[y:y+h, x:x+w], id, key) for (x, y, w, h) in faces]
+
+
+_worker_detector = None
+
+
+def _init_worker():
+    global _worker_detector
+    cv2.setNumThreads(1)
+    _worker_detector = FaceDetector(get_model_registry().get_cascade())
+
+
+def _process_chunk(image_paths):
+    return [_process_image(image_path, _worker_detector) for image_path in image_paths]
+
+
+def _iter_processed(image_paths, detector, workers, chunk_size):
+    """Yield one list of (face, id, key) per image, in image_paths order."""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, (len(image_paths) + chunk_size - 1) // chunk_size)
+
+    if workers <= 1:
+        if detector is None:
+            # Training runs on the TrainingQueue thread; the registry's cascade may be in use by a login on the UI thread.
+            detector = FaceDetector()
+        for image_path in image_paths:
+            yield _process_image(image_path, detector)
+        return
+
+    chunks = [image_paths[i:i + chunk_size] for i in range(0, len(image_paths), chunk_size)]
+    # Training runs on a thread of the UI process; forking a multithreaded process can deadlock the children,
+    # so the workers are spawned fresh and each loads its own cascade.
+    with multiprocessing.get_context('spawn').Pool(workers, initializer=_init_worker) as pool:
+        for results in pool.imap(_process_chunk, chunks):
+            yield from results
+
+
+def list_image_paths(path=DATA_DIR, face_id=None):
+    prefix = 'User.' if face_id is None else f'User.{face_id}.'
+    return [os.path.join(path, f) for f in os.listdir(path) if f.startswith(prefix) and f.endswith('.jpg')]
+
+
+def get_images_and_labels(path=DATA_DIR, face_id=None, detector=None, workers=TRAIN_WORKERS, chunk_size=TRAIN_CHUNK_SIZE,
+                          progress=None, image_paths=None):
+    if image_paths is None:
+        image_paths = list_image_paths(path, face_id)
+    face_samples = []
+    ids = []
+    keys = []
+
+    for done, image_results in enumerate(_iter_processed(image_paths, detector, workers, chunk_size), start=1):
+        for face, id, key in image_results:
+            face_samples.append(face)
+            ids.append(id)
+            keys.append(key)
+        if progress:
+            progress(done)
+    return face_samples, ids, keys
+
+
+def load_training_samples(path=DATA_DIR, face_id=None, workers=TRAIN_WORKERS, chunk_size=TRAIN_CHUNK_SIZE, progress=None):
+    """Collect legacy JPEG samples and packed store samples.
+
+    progress, if given, is called as progress(images_processed, images_total, users_trained);
+    training reports the final users_trained with None for the image counts.
+    """
+    image_paths = list_image_paths(path, face_id)
+    store = FaceSampleStore(os.path.join(path, 'samples'))
+    face_ids = store.face_ids() if face_id is None else [face_id]
+    total = len(image_paths) + sum(store.count(id) for id in face_ids)
+
+    def _image_progress(done):
+        if progress:
+            progress(done, total, 0)
+
+    faces, ids, keys = get_images_and_labels(path, workers=workers, chunk_size=chunk_size,
+                                             progress=_image_progress, image_paths=image_paths)
+
+    processed = len(image_paths)
+    for id in face_ids:
+        for sample in store.get_samples(id):
+            faces.append(sample)
+            ids.append(id)
+            keys.append(hashlib.sha1(sample.tobytes()).hexdigest())
+        processed += store.count(id)
+        if progress:
+            progress(processed, total, 0)
+    return faces, ids, keys
+
+
+def save_model(recognizer, model_path):
+    """Write the model next to model_path and rename it into place, so readers never see a partial file."""
+    tmp_path = os.path.splitext(model_path)[0] + '.tmp.yml'
+    recognizer.save(tmp_path)
+    os.replace(tmp_path, model_path)
+    refresh_binary_model(model_path, recognizer)
+    get_model_registry().publish(recognizer, model_path)
+
+
+def update_ann_index(model_path, recognizer, faces=None, labels=None):
+    """Keep trainer.ivf.npz in step with the model, if an index has been built for it.
+
+    With faces and labels the new samples are appended, as recognizer.update()
+    does; otherwise every sample is reassigned, keeping the existing clusters
+    unless the gallery size changed a lot. Call before save_model so the
+    index is on disk when the new model is published.
+    """
+    from app.ann_index import IVFIndex, index_path
+    from app.lbph import NumpyLBPHRecognizer, spatial_histogram
+
+    path = index_path(model_path)
+    if not os.path.exists(path):
+        return
+    try:
+        index = IVFIndex.load(path)
+        if faces is None:
+            engine = NumpyLBPHRecognizer.from_cv2(recognizer)
+            index.reassign(engine.histograms, engine.labels)
+        else:
+            histograms = np.vstack([spatial_histogram(face, recognizer.getRadius(), recognizer.getNeighbors(),
+                                                      (recognizer.getGridX(), recognizer.getGridY())) for face in faces])
+            index.add(histograms, labels)
+        index.save(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error updating face index: {e}")
+
+
+def train_face_model(path=DATA_DIR, face_id=None, full=False, workers=TRAIN_WORKERS, chunk_size=TRAIN_CHUNK_SIZE,
+                     progress=None):
+    """Fold face_id's new samples into the existing model, or rebuild it from every sample."""
+    model_path = os.path.join(path, MODEL_FILE)
+    manifest = None if full else load_manifest(path)
+    metrics = get_metrics()
+
+    if face_id is None or manifest is None or not os.path.exists(model_path):
+        return _train_full(path, workers, chunk_size, progress)
+
+    metrics.count('train.incremental_runs')
+    with metrics.stage('train.load_samples'):
+        faces, ids, keys = load_training_samples(path, face_id=face_id, workers=workers, chunk_size=chunk_size,
+                                                 progress=progress)
+    known = manifest.get(face_id, set())
+    if known - set(keys):
+        # Re-enrolment replaced samples the model still holds; update() cannot remove them.
+        print(f"Face ID {face_id} was re-enrolled; rebuilding the model.")
+        return _train_full(path, workers, chunk_size, progress)
+    new = [i for i, key in enumerate(keys) if key not in known]
+    metrics.count('train.samples', len(new))
+    if not new:
+        print(f"Model is already up to date for Face ID {face_id}.")
+        return False
+
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    with metrics.stage('train.read_model'):
+        recognizer.read(model_path)
+    with metrics.stage('train.update'):
+        recognizer.update([faces[i] for i in new], np.array([ids[i] for i in new]))
+    with metrics.stage('train.index'):
+        update_ann_index(model_path, recognizer, [faces[i] for i in new], [ids[i] for i in new])
+    with metrics.stage('train.save'):
+        save_model(recognizer, model_path)
+
+    manifest[face_id] = known | {keys[i] for i in new}
+    save_manifest(manifest, path)
+    if progress:
+        progress(None, None, 1)
+    print(f"Model updated with {len(new)} new samples for Face ID {face_id}.")
+    return True
+
+
+def _train_full(path, workers, chunk_size, progress=None):
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    if not os.path.exists(path):
+        os.makedirs(path)
+
+    metrics = get_metrics()
+    metrics.count('train.full_runs')
+    with metrics.stage('train.load_samples'):
+        faces, ids, keys = load_training_samples(path, workers=workers, chunk_size=chunk_size, progress=progress)
+    metrics.count('train.samples', len(faces))
+    if not faces:
+        print("No facial images were found.")
+        return False
+
+    with metrics.stage('train.train'):
+        recognizer.train(faces, np.array(ids))
+    with metrics.stage('train.index'):
+        update_ann_index(os.path.join(path, MODEL_FILE), recognizer)
+    with metrics.stage('train.save'):
+        save_model(recognizer, os.path.join(path, MODEL_FILE))
+
+    manifest = {}
+    for id, key in zip(ids, keys):
+        manifest.setdefault(id, set()).add(key)
+    save_manifest(manifest, path)
+    users = len(np.unique(ids))
+    if progress:
+        progress(None, None, users)
+    print(f"{users} kullanıcı için model eğitildi.")
+    return True
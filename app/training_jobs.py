@@ -0,0 +1,106 @@
+import threading
+import time
+
+
+class TrainingQueue:
+    """Runs model training on a background thread.
+
+    Requests that arrive while a run is queued or in progress are merged into
+    the next run. A pending full rebuild absorbs any incremental requests, and
+    several incremental requests become one run that updates each face_id in
+    turn. snapshot() returns the latest progress so the UI can poll it.
+    """
+
+    def __init__(self, path=None, train=None):
+        if train is None:
+            from app.trainer import train_face_model as train
+        self.path = path
+        self.train = train
+        self._condition = threading.Condition()
+        self._pending = None
+        self._running = False
+        self._users_base = 0
+        self._state = {
+            'state': 'idle',
+            'images_processed': 0,
+            'images_total': 0,
+            'users_trained': 0,
+            'runs': 0,
+            'merged_requests': 0,
+            'last_error': None,
+            'last_duration_s': None,
+        }
+        self._thread = threading.Thread(target=self._worker, daemon=True, name="training")
+        self._thread.start()
+
+    def submit(self, face_id=None, full=False):
+        with self._condition:
+            if self._pending is None:
+                self._pending = {'full': False, 'face_ids': []}
+            else:
+                self._state['merged_requests'] += 1
+            if full or face_id is None:
+                self._pending['full'] = True
+            elif face_id not in self._pending['face_ids']:
+                self._pending['face_ids'].append(face_id)
+            if not self._running:
+                self._state['state'] = 'queued'
+            self._condition.notify()
+
+    def snapshot(self):
+        with self._condition:
+            return dict(self._state)
+
+    def busy(self):
+        with self._condition:
+            return self._running or self._pending is not None
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._running or self._pending is not None:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def _progress(self, images_processed, images_total, users_trained):
+        with self._condition:
+            if images_processed is not None:
+                self._state['images_processed'] = images_processed
+                self._state['images_total'] = images_total
+            self._state['users_trained'] = self._users_base + users_trained
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                while self._pending is None:
+                    self._condition.wait()
+                job, self._pending = self._pending, None
+                self._running = True
+                self._users_base = 0
+                self._state.update(state='running', images_processed=0, images_total=0, users_trained=0)
+
+            started = time.perf_counter()
+            error = None
+            try:
+                kwargs = {'progress': self._progress}
+                if self.path is not None:
+                    kwargs['path'] = self.path
+                if job['full']:
+                    self.train(full=True, **kwargs)
+                else:
+                    for face_id in job['face_ids']:
+                        self.train(face_id=face_id, **kwargs)
+                        with self._condition:
+                            self._users_base = self._state['users_trained']
+            except Exception as e:
+                error = str(e)
+                print(f"Error training face model: {e}")
+
+            with self._condition:
+                self._running = False
+                self._state.update(state='idle' if self._pending is None else 'queued', runs=self._state['runs'] + 1, last_error=error,
+                                   last_duration_s=time.perf_counter() - started)
+                self._condition.notify_all()
@@ -6,6 +6,7 @@ from app.repository import User
 import re
 from tkinter import simpledialog
 import base64
+from concurrent.futures import ThreadPoolExecutor
 
 class UserInterface:
     def center_window(self, width=1000, height=700):
@@ -15,8 +16,10 @@ class UserInterface:
         y = int((screen_height - height) / 2)
         self.window.geometry(f"{width}x{height}+{x}+{y}")
 
-    def __init__(self, repository):
+    def __init__(self, repository, auth_workers=2):
         self.repository = repository
+        # bcrypt runs here so that hashing never blocks the Tk mainloop.
+        self.auth_executor = ThreadPoolExecutor(max_workers=auth_workers, thread_name_prefix="auth")
         self.window = tk.Tk()
         self.window.title("Face Recognition System")
         self.center_window()
@@ -114,8 +117,22 @@ class UserInterface:
                                 ("pressed", "#B71C1C")])  
         
         self.window.option_add('*TButton.borderRadius', 20)
+        self.training_queue = None
+        self.training_polling = False
+        self.training_status = tk.Label(self.window, text="",
+                                        font=("Segoe UI", 10),
+                                        fg=self.colors["text_secondary"],
+                                        bg=self.colors["background"])
         self.create_oval_button_style() 
         self.frames = {}
+        # Frames are built the first time show_frame asks for them.
+        self.frame_builders = {
+            "main_menu": self.create_main_menu,
+            "login": self.create_login_frame,
+            "register": self.create_register_frame,
+            "identity": self.create_identity_frame,
+            "forgot_password": self.create_forgot_password_frame,
+        }
         
         self.illustration_image = None
         possible_image_paths = [
@@ -126,8 +143,7 @@ class UserInterface:
         for image_path in possible_image_paths:
             if os.path.exists(image_path):
                 try:
-                    img = Image.open(image_path)
-                    img = img.resize((450, 450), Image.LANCZOS)
+                    img = self.load_resized_illustration(image_path)
                     self.illustration_image = ImageTk.PhotoImage(img)
                     print(f"Successfully loaded image from: {image_path}")
                     image_loaded = True
@@ -139,15 +155,21 @@ class UserInterface:
             print("Could not find illustration image in any location. Using placeholder.")
             self.download_illustration()
             
-        
-        self.create_main_menu()
-        self.create_login_frame()
-        self.create_register_frame()
-        self.create_identity_frame()
-        self.create_forgot_password_frame()
-        
         self.show_frame("main_menu")
 
+    def load_resized_illustration(self, image_path, size=(450, 450)):
+        cache_path = os.path.join("data", "cache", f"illustration_{size[0]}x{size[1]}.png")
+        if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(image_path):
+            return Image.open(cache_path)
+
+        img = Image.open(image_path).resize(size, Image.LANCZOS)
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            img.save(cache_path)
+        except OSError as e:
+            print(f"Could not cache resized illustration: {e}")
+        return img
+
     def create_oval_button_style(self):
         def _create_oval_button(widget, fill_color, hover_color):
             canvas = tk.Canvas(widget, borderwidth=0, highlightthickness=0, bg=self.colors["background"])
@@ -199,40 +221,49 @@ class UserInterface:
                 _create_oval_button(btn, self.colors["primary"], self.colors["primary_dark"])
             return btn
         
-    def train_face_model(self):
-        import cv2
-        import numpy as np
-        import os
-
-        path = 'data'
-        recognizer = cv2.face.LBPHFaceRecognizer_create()
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-
-        def get_images_and_labels(path):
-            image_paths = [os.path.join(path, f) for f in os.listdir(path) if f.endswith('.jpg')]
-            face_samples = []
-            ids = []
-
-            for image_path in image_paths:
-                img = cv2.imread(image_path)
-                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-                faces = face_cascade.detectMultiScale(gray, 1.3, 5)
-
-                for (x, y, w, h) in faces:
-                    face_samples.append(gray[y:y+h, x:x+w])
-                    id = int(os.path.split(image_path)[-1].split('.')[1])
-                    ids.append(id)
-            return face_samples, ids
-
-        faces, ids = get_images_and_labels(path)
-        if faces:
-            recognizer.train(faces, np.array(ids))
-            if not os.path.exists("data"):
-                os.makedirs("data")
-            recognizer.save(os.path.join('data', 'trainer.yml'))
-            print(f"{len(np.unique(ids))} kullanıcı için model eğitildi.")
+    def train_face_model(self, face_id=None, full=False):
+        if self.training_queue is None:
+            from app.training_jobs import TrainingQueue
+            self.training_queue = TrainingQueue()
+        self.training_queue.submit(face_id=face_id, full=full)
+        if not self.training_polling:
+            self.training_polling = True
+            self.poll_training()
+
+    def poll_training(self):
+        progress = self.training_queue.snapshot()
+        if progress["state"] == "idle":
+            self.training_polling = False
+            if progress["last_error"]:
+                self.training_status.config(text=f"Model training failed: {progress['last_error']}")
+            else:
+                self.training_status.config(text=f"Model trained for {progress['users_trained']} user(s).")
+            self.window.after(3000, self.training_status.place_forget)
+            return
+
+        if progress["images_total"]:
+            text = f"Training model... {progress['images_processed']}/{progress['images_total']} images"
         else:
-            print("No facial images were found.")
+            text = "Training model..."
+        self.training_status.config(text=text)
+        self.training_status.place(relx=0.0, rely=1.0, anchor="sw", x=10, y=-10)
+        self.window.after(200, self.poll_training)
+
+    def run_in_background(self, func, on_done, *args):
+        future = self.auth_executor.submit(func, *args)
+
+        def _poll():
+            if not future.done():
+                self.window.after(20, _poll)
+                return
+            try:
+                result = future.result()
+            except Exception as e:
+                messagebox.showerror("Error", f"Unexpected error:\n{str(e)}")
+                return
+            on_done(result)
+
+        self.window.after(20, _poll)
 
     def validate_password(self, password):
         if len(password) < 8:
@@ -246,10 +277,7 @@ class UserInterface:
         return True, ""
 
     def check_username_exists(self, username):
-        for user in self.repository.users:
-            if user.username == username:
-                return True
-        return False
+        return self.repository.find_by_username(username) is not None
 
     def create_main_menu(self):
         main_frame = tk.Frame(self.window, bg=self.colors["background"])
@@ -350,15 +378,17 @@ class UserInterface:
             messagebox.showerror("Error", "Please login first.")
             return
 
-        face_id = self.repository.users.index(user) + 1
-        user.face_id = face_id
-        self.repository.save_to_file()
+        face_id = self.repository.next_face_id(user)
 
         try:
             from app.face_register import register_face
-            register_face(face_id)
+            if not register_face(face_id):
+                messagebox.showerror("Error", "No usable face samples were captured. Please try again.")
+                return
+            self.repository.set_face_id(user, face_id)
+            self.repository.save_user(user)
             messagebox.showinfo("Success", "Face data registered successfully.")
-            self.train_face_model()
+            self.train_face_model(face_id=face_id)
 
         except Exception as e:
             messagebox.showerror("Error", f"Error registering face data:\n{str(e)}")
@@ -696,6 +726,8 @@ class UserInterface:
             messagebox.showerror("Error", "Please login first.")
 
     def show_frame(self, frame_name):
+        if frame_name not in self.frames:
+            self.frame_builders[frame_name]()
         for frame in self.frames.values():
             frame.pack_forget()  
         self.frames[frame_name].pack(fill="both", expand=True)  
@@ -734,10 +766,15 @@ class UserInterface:
         user_input = simpledialog.askstring("Email Verification", f"Enter the 6-digit code sent to {mail}:")
 
         if user_input == code:
+            def _on_registered(registered):
+                if registered:
+                    messagebox.showinfo("Success", "Verification successful, user registered!")
+                    self.show_frame("login")
+                else:
+                    messagebox.showerror("Error", "Username already exists!")
+
             user = User(username, password, mail)
-            self.repository.register(user)
-            messagebox.showinfo("Success", "Verification successful, user registered!")
-            self.show_frame("login")
+            self.run_in_background(self.repository.register, _on_registered, user)
         else:
             messagebox.showerror("Error", "Invalid verification code! Registration cancelled.")
 
@@ -749,12 +786,14 @@ class UserInterface:
             messagebox.showerror("Error", "Username and password are required!")
             return
 
-        self.repository.login(username, password)
-        if self.repository.isLoggedIn:
-            messagebox.showinfo("Success", "Login successful")
-            self.show_frame("identity")
-        else:
-            messagebox.showerror("Error", "Invalid username or password")
+        def _on_login(user):
+            if user:
+                messagebox.showinfo("Success", "Login successful")
+                self.show_frame("identity")
+            else:
+                messagebox.showerror("Error", "Invalid username or password")
+
+        self.run_in_background(self.repository.login, _on_login, username, password)
 
     def logout_user(self):
         self.repository.logout()
@@ -767,11 +806,14 @@ class UserInterface:
             messagebox.showerror("Error", "Please register your face first.")
             return
 
-        self.repository.delete_face_data(user.face_id)
-
         from app.face_register import register_face
-        register_face(user.face_id)
-        self.train_face_model()
+        if not register_face(user.face_id):
+            messagebox.showerror("Error", "No usable face samples were captured. Your existing face data was kept.")
+            return
+
+        # register_face replaced the packed samples; older JPEG samples would otherwise be trained alongside them.
+        self.repository.delete_legacy_face_images(user.face_id)
+        self.train_face_model(full=True)
 
         messagebox.showinfo("Success", "Face data updated successfully.")
 
@@ -782,9 +824,9 @@ class UserInterface:
             return
 
         self.repository.delete_face_data(user.face_id)
-        user.face_id = None
-        self.repository.save_to_file()
-        self.train_face_model()
+        self.repository.set_face_id(user, None)
+        self.repository.save_user(user)
+        self.train_face_model(full=True)
 
         messagebox.showinfo("Success", "Face data deleted successfully.")
 
@@ -900,13 +942,7 @@ class UserInterface:
             messagebox.showerror("Error", "Please enter your email address.")
             return
             
-        email_exists = False
-        for user in self.repository.users:
-            if user.mail == email:
-                email_exists = True
-                break
-                
-        if not email_exists:
+        if self.repository.find_by_mail(email) is None:
             messagebox.showerror("Error", "Email not found in our records.")
             return
             
@@ -938,9 +974,11 @@ class UserInterface:
         result = self.repository.verify_reset_code(email, code)
         
         if result:
-            self.repository.reset_password(email, new_password)
-            messagebox.showinfo("Success", "Password has been reset successfully. You can now login with your new password.")
-            self.show_frame("login")
+            def _on_reset(reset):
+                messagebox.showinfo("Success", "Password has been reset successfully. You can now login with your new password.")
+                self.show_frame("login")
+
+            self.run_in_background(self.repository.reset_password, _on_reset, email, new_password)
         else:
             messagebox.showerror("Error", "Invalid or expired verification code.")
 
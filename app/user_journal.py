@@ -0,0 +1,110 @@
+import json
+import os
+
+SNAPSHOT_FILE = 'users.snapshot'
+JOURNAL_FILE = 'users.journal'
+LEGACY_FILE = 'users.json'
+COMPACT_EVERY = 1000
+
+
+class UserJournal:
+    """Encrypted user storage: a compacted snapshot plus an append-only journal.
+
+    The snapshot is one Fernet token holding every user record. Every
+    single-user change is appended to the journal as its own Fernet token on
+    its own line, so an edit costs one small encrypt and one append instead of
+    rewriting every user. Loading replays the journal over the snapshot;
+    records are keyed by username and keep their original order.
+    """
+
+    def __init__(self, fernet, path='data', compact_every=COMPACT_EVERY):
+        self.fernet = fernet
+        self.path = path
+        self.compact_every = compact_every
+        self.snapshot_path = os.path.join(path, SNAPSHOT_FILE)
+        self.journal_path = os.path.join(path, JOURNAL_FILE)
+        self.legacy_path = os.path.join(path, LEGACY_FILE)
+        self.tail_records = 0
+        self._torn_tail = False
+
+    def load(self, migrate=True):
+        """Return every user record. With migrate=False a legacy users.json is read but left in place."""
+        records = {}
+        if not os.path.exists(self.snapshot_path) and os.path.exists(self.legacy_path):
+            if migrate:
+                self.migrate_legacy()
+            else:
+                for record in self.read_legacy():
+                    records[record['username']] = record
+
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'rb') as file:
+                data = file.read()
+            if data:
+                for record in json.loads(self.fernet.decrypt(data)):
+                    records[record['username']] = record
+
+        self.tail_records = 0
+        self._torn_tail = False
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'rb') as file:
+                for line in file:
+                    self._torn_tail = not line.endswith(b'\n')
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(self.fernet.decrypt(line))
+                    except Exception as e:
+                        # Usually a half-written last line after a crash.
+                        print(f"Skipping unreadable journal entry: {e}")
+                        continue
+                    records[record['username']] = record
+                    self.tail_records += 1
+        return list(records.values())
+
+    def append(self, record):
+        """Append one user record; returns True once the journal is due for compaction."""
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        token = self.fernet.encrypt(json.dumps(record).encode())
+        with open(self.journal_path, 'ab') as file:
+            if self._torn_tail:
+                file.write(b'\n')
+                self._torn_tail = False
+            file.write(token + b'\n')
+            file.flush()
+            os.fsync(file.fileno())
+        self.tail_records += 1
+        return self.tail_records >= self.compact_every
+
+    def compact(self, records):
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(self.fernet.encrypt(json.dumps(records).encode()))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+        # Replaying a stale journal over the new snapshot is harmless, so a
+        # crash before this truncate loses nothing.
+        open(self.journal_path, 'wb').close()
+        self.tail_records = 0
+        self._torn_tail = False
+
+    def read_legacy(self):
+        """Decrypt the old single-blob users.json."""
+        with open(self.legacy_path, 'r') as file:
+            data = file.read()
+        if not data:
+            return []
+        return [json.loads(user_data) for user_data in json.loads(self.fernet.decrypt(data.encode()))]
+
+    def migrate_legacy(self):
+        """One-time conversion of the old single-blob users.json."""
+        records = self.read_legacy()
+        self.compact(records)
+        os.replace(self.legacy_path, self.legacy_path + '.migrated')
+        print(f"Migrated {len(records)} users from {LEGACY_FILE} to the user journal.")
@@ -0,0 +1,385 @@
+"""Benchmarks for the recognition, training and user-store hot paths.
+
+Run from the project root:
+
+    python -m benchmarks.run --users 200 --samples 20 --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, redirect_stdout
+
+import cv2
+import numpy as np
+
+from app.sample_store import FaceSampleStore, SAMPLE_SIZE
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+RESOLUTIONS = [(320, 240), (640, 480), (1280, 720), (1920, 1080)]
+USER_STORE_SIZES = [1000, 10000, 100000]
+
+
+def synthetic_face(rng, base):
+    noise = rng.normal(0, 12, base.shape)
+    shift = rng.integers(-3, 4, size=2)
+    return np.clip(np.roll(base, shift, axis=(0, 1)) + noise, 0, 255).astype(np.uint8)
+
+
+def synthetic_gallery(users, samples, seed=0):
+    """Return (faces, labels): one smooth random pattern per user plus per-sample noise and jitter."""
+    rng = np.random.default_rng(seed)
+    faces = []
+    labels = []
+    for face_id in range(1, users + 1):
+        coarse = rng.integers(0, 256, (12, 12)).astype(np.float32)
+        base = cv2.resize(coarse, SAMPLE_SIZE, interpolation=cv2.INTER_CUBIC)
+        for _ in range(samples):
+            faces.append(synthetic_face(rng, base))
+            labels.append(face_id)
+    return faces, np.array(labels)
+
+
+def synthetic_frame(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 256, (height // 8, width // 8, 3)).astype(np.uint8)
+    return cv2.GaussianBlur(cv2.resize(frame, (width, height)), (5, 5), 0)
+
+
+def latency_stats(samples):
+    samples = sorted(samples)
+    return {
+        'count': len(samples),
+        'mean_ms': statistics.mean(samples) * 1000,
+        'p50_ms': samples[len(samples) // 2] * 1000,
+        'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+    }
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere.
+    return peak / (1024 * 1024) if platform.system() == 'Darwin' else peak / 1024
+
+
+@contextmanager
+def working_directory(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def bench_detect(frames=30, image_dir=None):
+    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    images = []
+    if image_dir:
+        images = [cv2.imread(os.path.join(image_dir, f)) for f in sorted(os.listdir(image_dir))]
+        images = [img for img in images if img is not None]
+
+    results = []
+    for width, height in RESOLUTIONS:
+        if images:
+            frame_set = [cv2.resize(img, (width, height)) for img in images[:frames]]
+        else:
+            frame_set = [synthetic_frame(width, height, seed=i) for i in range(4)]
+        grays = [cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) for frame in frame_set]
+
+        timings = []
+        for i in range(frames):
+            start = time.perf_counter()
+            face_cascade.detectMultiScale(grays[i % len(grays)], 1.3, 5)
+            timings.append(time.perf_counter() - start)
+        result = {'resolution': f'{width}x{height}', 'fps': len(timings) / sum(timings)}
+        result.update(latency_stats(timings))
+        results.append(result)
+    return results
+
+
+def bench_predict(users, samples, probes=50, steps=4, prefilter=5):
+    """Per-probe latency of cv2 LBPH predict against the NumPy engine, as the gallery grows."""
+    from app.lbph import NumpyLBPHRecognizer
+
+    faces, labels = synthetic_gallery(users, samples)
+    rng = np.random.default_rng(1)
+    probe_faces = [faces[i] for i in rng.integers(0, len(faces), probes)]
+
+    results = []
+    for step in range(1, steps + 1):
+        gallery_users = max(1, users * step // steps)
+        count = gallery_users * samples
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        recognizer.train(faces[:count], labels[:count])
+        expected = [recognizer.predict(probe)[0] for probe in probe_faces]
+
+        engines = [('cv2', recognizer.predict),
+                   ('numpy', NumpyLBPHRecognizer.from_cv2(recognizer).predict),
+                   (f'numpy_prefilter_{prefilter}', NumpyLBPHRecognizer.from_cv2(recognizer, prefilter=prefilter).predict)]
+        for engine, predict in engines:
+            timings = []
+            predicted = []
+            for probe in probe_faces:
+                start = time.perf_counter()
+                predicted.append(predict(probe)[0])
+                timings.append(time.perf_counter() - start)
+            result = {'engine': engine, 'users': gallery_users, 'samples': count,
+                      'agreement_with_cv2': float(np.mean(np.array(predicted) == np.array(expected)))}
+            result.update(latency_stats(timings))
+            results.append(result)
+
+        batch_engine = NumpyLBPHRecognizer.from_cv2(recognizer)
+        start = time.perf_counter()
+        batch_engine.predict_batch(probe_faces)
+        results.append({'engine': 'numpy_batch', 'users': gallery_users, 'samples': count,
+                        'mean_ms': (time.perf_counter() - start) * 1000 / len(probe_faces)})
+    return results
+
+
+def bench_ann(users, samples, probes=100, nprobes=(1, 2, 4, 8, 16, 32), nlist=None):
+    """Recall and latency of the IVF index at several nprobe settings, against exact NumPy search."""
+    from app.ann_index import IVFIndex
+    from app.lbph import NumpyLBPHRecognizer
+
+    faces, labels = synthetic_gallery(users, samples)
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.train(faces, labels)
+    engine = NumpyLBPHRecognizer.from_cv2(recognizer)
+    del recognizer
+
+    rng = np.random.default_rng(2)
+    probe_faces = [synthetic_face(rng, faces[i]) for i in rng.integers(0, len(faces), probes)]
+    histograms = [engine.histogram(face) for face in probe_faces]
+
+    def _timed():
+        timings = []
+        found = []
+        for histogram in histograms:
+            start = time.perf_counter()
+            found.append(engine.predict_histograms([histogram]))
+            timings.append(time.perf_counter() - start)
+        labels_found = np.array([f[0][0] for f in found])
+        distances_found = np.array([f[1][0] for f in found])
+        return labels_found, distances_found, timings
+
+    exact_labels, exact_distances, timings = _timed()
+    result = {'nprobe': None, 'samples': len(labels), 'recall_at_1': 1.0, 'label_agreement': 1.0}
+    result.update(latency_stats(timings))
+    results = [result]
+
+    index = IVFIndex(nlist=nlist)
+    start = time.perf_counter()
+    index.build(engine.histograms, engine.labels)
+    build_s = time.perf_counter() - start
+    engine.set_index(index)
+    for nprobe in nprobes:
+        index.nprobe = nprobe
+        found_labels, found_distances, timings = _timed()
+        result = {
+            'nprobe': nprobe,
+            'nlist': len(index.centroids),
+            'samples': len(labels),
+            'build_s': build_s,
+            'mean_candidates': float(np.mean([len(index.candidates(h)) for h in histograms])),
+            'recall_at_1': float(np.mean(np.isclose(found_distances, exact_distances))),
+            'label_agreement': float(np.mean(found_labels == exact_labels)),
+        }
+        result.update(latency_stats(timings))
+        results.append(result)
+    return results
+
+
+def bench_model_load(users, samples, steps=2, repeats=3):
+    """Load time and file size of trainer.yml against the binary .lbph model."""
+    from app.lbph import NumpyLBPHRecognizer
+    from app.model_format import yml_to_binary
+
+    faces, labels = synthetic_gallery(users, samples)
+    probe = faces[0]
+    results = []
+    for step in range(1, steps + 1):
+        count = max(1, users * step // steps) * samples
+        root = tempfile.mkdtemp(prefix='face_bench_')
+        try:
+            yml_path = os.path.join(root, 'trainer.yml')
+            recognizer = cv2.face.LBPHFaceRecognizer_create()
+            recognizer.train(faces[:count], labels[:count])
+            recognizer.save(yml_path)
+            del recognizer
+            binary_path = yml_to_binary(yml_path)
+
+            loaders = [
+                ('cv2_yml', lambda: cv2.face.LBPHFaceRecognizer_create(), yml_path),
+                ('numpy_yml', NumpyLBPHRecognizer, yml_path),
+                ('numpy_binary_mmap', NumpyLBPHRecognizer, binary_path),
+            ]
+            for name, create, path in loaders:
+                timings = []
+                for _ in range(repeats):
+                    model = create()
+                    start = time.perf_counter()
+                    model.read(path)
+                    timings.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                model.predict(probe)
+                first_predict_ms = (time.perf_counter() - start) * 1000
+                del model
+                results.append({
+                    'format': name,
+                    'samples': count,
+                    'file_mb': os.path.getsize(path) / (1024 * 1024),
+                    'load_ms': min(timings) * 1000,
+                    'first_predict_ms': first_predict_ms,
+                })
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+def _train_in_child(users, samples):
+    from app.trainer import train_face_model
+
+    faces, labels = synthetic_gallery(users, samples)
+    root = tempfile.mkdtemp(prefix='face_bench_')
+    try:
+        store = FaceSampleStore(os.path.join(root, 'samples'))
+        for face_id in np.unique(labels):
+            store.replace_samples(int(face_id), [f for f, l in zip(faces, labels) if l == face_id])
+        del faces
+
+        rss_before = peak_rss_mb()
+        start = time.perf_counter()
+        train_face_model(path=root, full=True)
+        elapsed = time.perf_counter() - start
+        return {
+            'users': users,
+            'samples': users * samples,
+            'wall_s': elapsed,
+            'peak_rss_mb': peak_rss_mb(),
+            'peak_rss_before_mb': rss_before,
+            'model_mb': os.path.getsize(os.path.join(root, 'trainer.yml')) / (1024 * 1024),
+        }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_train(users, samples):
+    # A fresh process keeps the peak RSS reading free of earlier benchmarks.
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(_train_in_child, users, samples).result()
+
+
+def bench_user_store(sizes=USER_STORE_SIZES):
+    import bcrypt
+    from app.repository import User, UserRepository
+
+    password = bcrypt.hashpw(b'Benchmark1', bcrypt.gensalt(4)).decode()
+    results = []
+    for size in sizes:
+        root = tempfile.mkdtemp(prefix='face_bench_')
+        try:
+            with working_directory(root):
+                os.makedirs('data')
+                repo = UserRepository()
+                repo.users = [User(f'user{i}', password, f'user{i}@example.com', face_id=i + 1) for i in range(size)]
+
+                start = time.perf_counter()
+                repo.save_to_file()
+                save_s = time.perf_counter() - start
+
+                edits = []
+                for user in repo.users[:50]:
+                    start = time.perf_counter()
+                    repo.save_user(user)
+                    edits.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                loaded = UserRepository()
+                load_s = time.perf_counter() - start
+
+                results.append({
+                    'users': size,
+                    'loaded': len(loaded.users),
+                    'save_s': save_s,
+                    'load_s': load_s,
+                    'save_user_ms': statistics.mean(edits) * 1000,
+                    'snapshot_mb': os.path.getsize(os.path.join('data', 'users.snapshot')) / (1024 * 1024),
+                    'journal_mb': os.path.getsize(os.path.join('data', 'users.journal')) / (1024 * 1024),
+                })
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+SECTIONS = ['detect', 'predict', 'ann', 'model_load', 'train', 'user_store']
+
+
+def run(args):
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'users': args.users,
+            'samples': args.samples,
+        }
+    }
+    sections = args.only or SECTIONS
+    if 'detect' in sections:
+        report['detect'] = bench_detect(args.frames, args.images)
+    if 'predict' in sections:
+        report['predict'] = bench_predict(args.users, args.samples)
+    if 'ann' in sections:
+        report['ann'] = bench_ann(args.users, args.samples, nprobes=args.nprobe)
+    if 'model_load' in sections:
+        report['model_load'] = bench_model_load(args.users, args.samples)
+    if 'train' in sections:
+        report['train'] = bench_train(args.users, args.samples)
+    if 'user_store' in sections:
+        report['user_store'] = bench_user_store(args.store_sizes)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Face recognition system benchmarks")
+    parser.add_argument('--users', type=int, default=100, help="Synthetic gallery size")
+    parser.add_argument('--samples', type=int, default=20, help="Samples per synthetic user")
+    parser.add_argument('--frames', type=int, default=30, help="Frames per detection resolution")
+    parser.add_argument('--images', help="Folder of real frames to use for detection instead of synthetic ones")
+    parser.add_argument('--store-sizes', type=int, nargs='+', default=USER_STORE_SIZES)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32],
+                        help="IVF clusters searched per query in the ann section")
+    parser.add_argument('--only', nargs='+', choices=SECTIONS)
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    # The app prints progress while training and loading users; keep stdout for the JSON report alone.
+    with redirect_stdout(sys.stderr):
+        report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text)
+        print(f"Benchmark report written to {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,72 @@
-from app.repository import UserRepository
-from app.ui import UserInterface
+import argparse
+import time
 
 if __name__ == "__main__":
-    repo = UserRepository()
+    parser = argparse.ArgumentParser(description="Face Recognition System")
+    parser.add_argument("--storage", choices=["json", "sqlite"], default="json",
+                        help="User store backend (default: encrypted JSON journal)")
+    parser.add_argument("--bcrypt-rounds", type=int, default=None,
+                        help="bcrypt cost for new password hashes; older hashes are upgraded at login")
+    parser.add_argument("--recognizer", choices=["cv2", "numpy", "ivf"], default="cv2",
+                        help="Face recognizer engine for face login (default: OpenCV LBPH)")
+    parser.add_argument("--service", metavar="URL", default=None,
+                        help="Identify faces through a shared recognition service "
+                             "(python -m app.recognition_service) instead of loading the model")
+    parser.add_argument("--target-fps", type=float, default=None,
+                        help="Frame rate face login and registration try to hold by detecting less often, "
+                             "on a smaller image and for fewer faces when the machine is busy")
+    parser.add_argument("--metrics", metavar="PATH", default=None,
+                        help="Record per-stage timings of face login, enrollment and training; "
+                             "written as JSON to PATH at exit and on SIGUSR1")
+    parser.add_argument("--timings", action="store_true",
+                        help="Print a startup timing breakdown once the first window is shown")
+    args = parser.parse_args()
+
+    timings = []
+    started = last = time.perf_counter()
+
+    def mark(stage):
+        global last
+        now = time.perf_counter()
+        timings.append((stage, now - last))
+        last = now
+
+    from app.repository import BCRYPT_ROUNDS, UserRepository
+    from app.ui import UserInterface
+    if args.storage == "sqlite":
+        from app.sqlite_repository import SQLiteUserRepository
+    mark("imports")
+
+    if args.metrics:
+        from app.metrics import get_metrics
+        get_metrics().enable(args.metrics)
+        get_metrics().install_signal_handler()
+
+    if args.target_fps:
+        from app.frame_scheduler import set_target_fps
+        set_target_fps(args.target_fps)
+
+    if args.recognizer != "cv2":
+        from app.model_registry import get_model_registry
+        get_model_registry().set_engine(args.recognizer)
+
+    bcrypt_rounds = args.bcrypt_rounds or BCRYPT_ROUNDS
+    if args.storage == "sqlite":
+        repo = SQLiteUserRepository(bcrypt_rounds=bcrypt_rounds)
+    else:
+        repo = UserRepository(bcrypt_rounds=bcrypt_rounds)
+    repo.recognition_service = args.service
+    mark("user load")
+
     ui = UserInterface(repo)
+    mark("ui build")
+
+    if args.timings:
+        ui.window.update()
+        mark("first window")
+        print("Startup timings:")
+        for stage, seconds in timings:
+            print(f"  {stage:<13}{seconds * 1000:8.1f} ms")
+        print(f"  {'total':<13}{(time.perf_counter() - started) * 1000:8.1f} ms")
+
     ui.run()
-    
-    
\ No newline at end of file
@@ -0,0 +1,31 @@
+import json
+import os
+
+from cryptography.fernet import Fernet
+
+from app.repository import User
+from app.sqlite_repository import SQLiteUserRepository, import_users
+from app.user_journal import LEGACY_FILE, SNAPSHOT_FILE
+
+
+def test_import_reads_legacy_users_json_without_migrating(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    key = Fernet.generate_key()
+    os.makedirs('secrets')
+    with open(os.path.join('secrets', 'secret.key'), 'wb') as file:
+        file.write(key)
+    legacy = [User('dave', 'hash-dave', 'dave@example.com', face_id=1).__dict__,
+              User('erin', 'hash-erin', 'erin@example.com').__dict__]
+    os.makedirs('data')
+    with open(os.path.join('data', LEGACY_FILE), 'w') as file:
+        file.write(Fernet(key).encrypt(json.dumps([json.dumps(record) for record in legacy]).encode()).decode())
+
+    assert import_users('data', os.path.join('data', 'users.db')) == 2
+
+    assert os.path.exists(os.path.join('data', LEGACY_FILE))
+    assert not os.path.exists(os.path.join('data', LEGACY_FILE + '.migrated'))
+    assert not os.path.exists(os.path.join('data', SNAPSHOT_FILE))
+    repository = SQLiteUserRepository(os.path.join('data', 'users.db'))
+    assert repository.find_by_face_id(1).username == 'dave'
+    assert repository.find_by_username('erin') is not None
+    repository.close()
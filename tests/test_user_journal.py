@@ -0,0 +1,90 @@
+import json
+import os
+
+import pytest
+from cryptography.fernet import Fernet
+
+from app.repository import User, UserRepository
+from app.user_journal import JOURNAL_FILE, LEGACY_FILE
+
+ROUNDS = 4
+
+
+def _names(repo):
+    return [user.username for user in repo.users]
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    repo = UserRepository(bcrypt_rounds=ROUNDS)
+    repo.register(User('alice', 'pw-alice', 'alice@example.com'))
+    repo.register(User('bob', 'pw-bob', 'bob@example.com'))
+    alice = repo.find_by_username('alice')
+    repo.set_face_id(alice, 1)
+    repo.save_user(alice)
+    return repo
+
+
+def _tear_last_journal_line():
+    journal_path = os.path.join('data', JOURNAL_FILE)
+    with open(journal_path, 'rb') as file:
+        data = file.read()
+    last_start = data.rstrip(b'\n').rfind(b'\n') + 1
+    with open(journal_path, 'wb') as file:
+        file.write(data[:last_start + (len(data) - last_start) // 2])
+
+
+def test_reload_keeps_registration_order(repo):
+    assert _names(UserRepository(bcrypt_rounds=ROUNDS)) == ['alice', 'bob']
+
+
+def test_reload_replays_journal_updates(repo):
+    reloaded = UserRepository(bcrypt_rounds=ROUNDS)
+    assert reloaded.find_by_face_id(1) is reloaded.find_by_username('alice')
+
+
+def test_reloaded_password_hashes_verify(repo):
+    reloaded = UserRepository(bcrypt_rounds=ROUNDS)
+    assert reloaded.login('bob', 'pw-bob') is reloaded.find_by_username('bob')
+
+
+def test_torn_tail_loses_only_the_last_change(repo):
+    _tear_last_journal_line()
+    reloaded = UserRepository(bcrypt_rounds=ROUNDS)
+    assert _names(reloaded) == ['alice', 'bob']
+    assert reloaded.find_by_username('alice').face_id is None
+
+
+def test_append_after_torn_tail_starts_a_new_line(repo):
+    _tear_last_journal_line()
+    UserRepository(bcrypt_rounds=ROUNDS).register(User('carol', 'pw-carol', 'carol@example.com'))
+    assert _names(UserRepository(bcrypt_rounds=ROUNDS)) == ['alice', 'bob', 'carol']
+
+
+def test_compaction_empties_journal_and_keeps_users(repo):
+    repo.save_to_file()
+    assert os.path.getsize(os.path.join('data', JOURNAL_FILE)) == 0
+    reloaded = UserRepository(bcrypt_rounds=ROUNDS)
+    assert _names(reloaded) == ['alice', 'bob']
+    assert reloaded.find_by_face_id(1) is reloaded.find_by_username('alice')
+
+
+def test_legacy_users_json_is_migrated(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    key = Fernet.generate_key()
+    os.makedirs('secrets')
+    with open(os.path.join('secrets', 'secret.key'), 'wb') as file:
+        file.write(key)
+    legacy = [User('dave', 'hash-dave', 'dave@example.com', face_id=3).__dict__,
+              User('erin', 'hash-erin', 'erin@example.com').__dict__]
+    os.makedirs('data')
+    with open(os.path.join('data', LEGACY_FILE), 'w') as file:
+        file.write(Fernet(key).encrypt(json.dumps([json.dumps(record) for record in legacy]).encode()).decode())
+
+    repo = UserRepository(bcrypt_rounds=ROUNDS)
+    assert _names(repo) == ['dave', 'erin']
+    assert repo.find_by_face_id(3) is repo.find_by_username('dave')
+    assert not os.path.exists(os.path.join('data', LEGACY_FILE))
+    assert os.path.exists(os.path.join('data', LEGACY_FILE + '.migrated'))
+    assert _names(UserRepository(bcrypt_rounds=ROUNDS)) == ['dave', 'erin']